@@ -4,9 +4,52 @@ config = {
     'health_check_interval': 5,
     'max_failures': 3,
     'timeout': 3,
-    'max_connections': 200,
-    'buffer_size': 4096,
-    'connection_pool_size': 10,
+    'max_connections': 200,  # Client connections in flight before new ones are shed with a 503
+    'max_queue_wait_ms': 500,  # Shed when connections wait longer than this for a worker (0 disables)
+    'shed_retry_after': 1,  # Retry-After seconds sent with a shed 503
+    'pause_accept': False,  # At max_connections, stop accepting instead of shedding (kernel backlog absorbs)
+    'listen_backlog': 512,
+    'buffer_size': 65536,  # Relay read size; larger reads cut per-byte CPU in the copy loop
+    'replay_buffer': 65536,  # Request bytes kept for retries until the backend answers (L4)
+    'response_framing': True,  # L4: end HTTP/1.x relays once the response is complete (frees the backend slot)
+    'connection_pool_size': 0,  # Idle pre-warmed connections kept per backend (0 disables pooling)
+    'pool_max_idle': 30,  # Seconds an idle pooled connection may sit unused
+    'pool_max_lifetime': 300,  # Seconds before a pooled connection is retired regardless of use
+    'mode': 'l4',  # Options: l4 (opaque TCP relay), l7 (HTTP/1.1 keep-alive, strategy runs per request)
+    'response_buffering': False,  # L7: read whole responses, free the backend, then send them to the client
+    'response_buffer_memory': 1048576,  # Bytes per response kept in memory before spilling to a temp file
+    'response_buffer_max': 67108864,  # Larger responses are streamed instead of buffered
+    'request_buffering': False,  # L7: read whole request bodies before picking a backend
+    'request_buffer_memory': 1048576,  # Bytes per request body kept in memory before spilling to a temp file
+    'request_buffer_max': 16777216,  # Larger chunked bodies get 413; larger Content-Length bodies are streamed
+    'keepalive_timeout': 5,  # Seconds an idle L7 client connection is kept open
+    'request_key': None,  # Cache-affinity key for key-aware strategies (beta1), e.g. {'source': 'header', 'name': 'X-User-Id'}
+                          # Sources: path (optional 'segments'), query, header, cookie (all need 'name' except path), client_ip
+    'adaptive_concurrency': False,  # Learn a per-backend in-flight limit from latency; backends at it are skipped
+    'concurrency_initial_limit': 20,
+    'concurrency_max_limit': 200,
+    'queue_max_depth': 100,  # Requests that may wait for a backend slot when all are at their limit
+    'queue_timeout_ms': 1000,  # Longest such a wait before the request gets a 503
+    'priority_classes': None,  # e.g. [{'name': 'interactive', 'weight': 4}, {'name': 'batch', 'weight': 1, 'shed_at': 0.6,
+                               #        'match': {'cidr': '10.8.0.0/16'}}]; see PriorityClassifier for the rules
+    'max_retries': 3,  # Attempts per request; retries go to untried backends and only when safe
+    'retry_budget': 0.2,  # Max retries as a fraction of requests (plus a small per-second allowance)
+    'retry_backoff_ms': 25,  # Jittered backoff window before the first retry, doubling up to retry_backoff_max_ms
+    'retry_backoff_max_ms': 250,
+    'deadline_header': 'X-Request-Deadline-Ms',  # Caller's remaining budget in ms; expired requests get a 504
+    'hedging': False,  # L7: duplicate slow idempotent requests to a backup server (first response wins)
+    'hedge_budget': 0.05,  # Max hedges as a fraction of requests
+    'hedge_delay_percentile': 0.95,  # Hedge once the primary is slower than this percentile
+    'data_plane': 'threaded',  # Options: threaded (executor per connection), asyncio (single event loop), selectors (epoll relay threads)
+    'relay_threads': 4,  # I/O threads for the selectors data plane
+    'relay_idle_timeout': 5.0,  # Selectors plane: seconds a relay may see no traffic
+    'first_byte_timeout': None,  # Selectors plane: seconds from request sent to first response byte (None disables)
+    'relay_total_timeout': None,  # Selectors plane: cap on a relay's whole lifetime in seconds (None disables)
+    'workers': 1,  # >1 starts that many SO_REUSEPORT worker processes under a supervisor
+    'pin_workers': False,  # Pin each worker process to one CPU with sched_setaffinity
+    'hot_restart_socket': None,  # Unix socket path; a new process started with the same path takes over the listener
+    'drain_grace': 30,  # Seconds a replaced process waits for in-flight connections before exiting
+    'zero_copy': False,  # Use os.splice for threaded L4 relays on Linux (falls back to the copy loop)
     'servers': [
         ('127.0.0.1', 8081),
         ('127.0.0.1', 8082),
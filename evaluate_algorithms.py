@@ -66,14 +66,14 @@ class AlgorithmEvaluator:
             metrics_dict['failed_requests'] += 1
             return
         
-        server_key = f"{selected['host']}:{selected['port']}"
+        server_key = f"{selected.host}:{selected.port}"
         
         # Increment connections
-        pool.increment_connections(selected['host'], selected['port'])
+        pool.increment_connections(selected.host, selected.port)
         
         # Find server config
         server_config = next(
-            (s for s in server_configs if s['host'] == selected['host'] and s['port'] == selected['port']),
+            (s for s in server_configs if s['host'] == selected.host and s['port'] == selected.port),
             None
         )
         
@@ -85,15 +85,15 @@ class AlgorithmEvaluator:
             # Simulate failure
             import random
             if random.random() < server_config['failure_rate']:
-                pool.mark_unhealthy(selected['host'], selected['port'])
+                pool.mark_unhealthy(selected.host, selected.port)
                 metrics_dict['failed_requests'] += 1
                 metrics_dict['server_failures'][server_key] += 1
             else:
-                pool.mark_healthy(selected['host'], selected['port'])
+                pool.mark_healthy(selected.host, selected.port)
                 metrics_dict['successful_requests'] += 1
         
         # Decrement connections
-        pool.decrement_connections(selected['host'], selected['port'])
+        pool.decrement_connections(selected.host, selected.port)
         
         # Record metrics
         end_time = time.time()
@@ -104,10 +104,10 @@ class AlgorithmEvaluator:
         
         # Record response time in strategy if supported
         if hasattr(strategy, 'record_response_time'):
-            strategy.record_response_time(selected['host'], selected['port'], response_time)
+            strategy.record_response_time(selected, response_time)
         
         # Record in pool
-        pool.record_response_time(selected['host'], selected['port'], response_time)
+        pool.record_response_time(selected, response_time)
     
     def run_stress_test(self, strategy_name, strategy_class):
         """Run stress test for a specific strategy"""
@@ -0,0 +1,110 @@
+import threading
+import time
+
+SHED_RESPONSE = ("HTTP/1.1 503 Service Unavailable\r\n"
+                 "Retry-After: {retry_after}\r\n"
+                 "Content-Length: 19\r\n"
+                 "Connection: close\r\n"
+                 "\r\n"
+                 "Service Unavailable")
+
+
+class AdmissionController:
+    """
+    Admission control at the listener
+
+    Caps the number of client connections in flight (queued on the executor
+    or being served) at `max_in_flight`. New connections are shed with a fast
+    503 + Retry-After when the cap is reached, or when connections have
+    recently been waiting longer than `max_queue_wait_ms` for a worker, so an
+    overload degrades a fraction of clients instead of slowing everyone.
+    With `pause_accept`, the listener stops accepting at the cap instead of
+    shedding, leaving excess connections in the kernel backlog.
+    """
+
+    def __init__(self, max_in_flight=200, max_queue_wait_ms=500, retry_after=1, pause_accept=False):
+        self.max_in_flight = max_in_flight
+        self.max_queue_wait = max_queue_wait_ms / 1000.0 if max_queue_wait_ms else None
+        self.retry_after = retry_after
+        self.pause_accept = pause_accept
+        self.response = SHED_RESPONSE.format(retry_after=retry_after).encode()
+
+        self.in_flight = 0
+        self.queue_wait = 0.0  # EWMA of seconds from accept to a worker picking the connection up
+        self.cond = threading.Condition()
+
+        self.admitted = 0
+        self.shed_in_flight = 0
+        self.shed_queue_wait = 0
+        self.accept_pauses = 0
+
+    def admit(self, shed_at=1.0):
+        """
+        Called on the accept thread for every new connection. `shed_at` scales
+        both thresholds down for lower priority classes, so they shed first.
+        """
+        with self.cond:
+            if self.in_flight >= self.max_in_flight * shed_at:
+                self.shed_in_flight += 1
+                return False
+            if self.max_queue_wait is not None and self.queue_wait > self.max_queue_wait * shed_at:
+                self.shed_queue_wait += 1
+                # Decay so a burst that has drained stops shedding once workers catch up
+                self.queue_wait *= 0.9
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def dequeued(self, accepted_at, shed_at=1.0):
+        """
+        Called when a worker picks up an admitted connection. Returns False if
+        it already waited past the threshold and should be shed rather than served.
+        """
+        waited = time.monotonic() - accepted_at
+        with self.cond:
+            self.queue_wait = 0.8 * self.queue_wait + 0.2 * waited
+            if self.max_queue_wait is not None and waited > self.max_queue_wait * shed_at:
+                self.shed_queue_wait += 1
+                return False
+            return True
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def wait_for_capacity(self, timeout=1.0):
+        """With pause_accept, block the accept loop while at the cap; returns True if there is room"""
+        if not self.pause_accept:
+            return True
+        with self.cond:
+            if self.in_flight < self.max_in_flight:
+                return True
+            self.accept_pauses += 1
+            return self.cond.wait_for(lambda: self.in_flight < self.max_in_flight, timeout)
+
+    def shed(self, client_sock):
+        """Fast 503 without blocking the caller, then close"""
+        try:
+            client_sock.setblocking(False)
+            client_sock.send(self.response)
+        except OSError:
+            pass
+        try:
+            client_sock.close()
+        except OSError:
+            pass
+
+    def get_stats(self):
+        with self.cond:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'admitted': self.admitted,
+                'shed_in_flight': self.shed_in_flight,
+                'shed_queue_wait': self.shed_queue_wait,
+                'shed_total': self.shed_in_flight + self.shed_queue_wait,
+                'accept_pauses': self.accept_pauses,
+                'queue_wait_ms': round(self.queue_wait * 1000, 2)
+            }
@@ -0,0 +1,383 @@
+import asyncio
+import time
+from functools import partial
+
+from .http_parser import parse_request, HttpError, HEAD_END, ExchangeTracker, request_method
+from .proxy import ReplayBuffer, unanswered_result, RELAYED, RETRYABLE, CLIENT_ABORTED
+from .timing import RequestTiming
+
+
+class AsyncDataPlane:
+    """
+    asyncio accept-and-relay data plane
+
+    Every client/backend pair is relayed by two lightweight tasks on a single
+    event loop, so concurrency is bounded by file descriptors instead of the
+    size of the LoadBalancer thread pool. Server selection and bookkeeping go
+    through the same LoadBalancer/ServerPool/Strategy calls as the threaded path.
+    """
+
+    def __init__(self, load_balancer, buffer_size=4096, idle_timeout=5.0):
+        self.lb = load_balancer
+        self.buffer_size = buffer_size
+        self.idle_timeout = idle_timeout
+        self.loop = None
+        self.server = None
+        self.stopped = None
+
+    def serve(self, listen_sock):
+        """Run the event loop on an already-bound listening socket until stop() is called"""
+        asyncio.run(self._serve(listen_sock))
+
+    def stop(self):
+        """Ask the loop to close its listener; returns False if the loop is not running"""
+        loop = self.loop
+        if loop and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self.stopped.set)
+                return True
+            except RuntimeError:
+                pass  # Loop already shut down
+        return False
+
+    def stop_accepting(self):
+        """Close the listener but keep relaying open connections; False if the loop is not running"""
+        loop = self.loop
+        if loop and not loop.is_closed() and self.server:
+            try:
+                loop.call_soon_threadsafe(self.server.close)
+                return True
+            except RuntimeError:
+                pass
+        return False
+
+    async def _serve(self, listen_sock):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        listen_sock.setblocking(False)
+
+        self.server = await asyncio.start_server(self.handle_client, sock=listen_sock)
+        try:
+            await self.stopped.wait()
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_client(self, client_reader, client_writer):
+        # No executor queue here, so admission is the in-flight cap alone
+        priority = self.lb.classify(client_writer.get_extra_info('socket'), client_writer.get_extra_info('peername'),
+                                    provisional=True)
+        if not self.lb.admission.admit(priority.shed_at if priority else 1.0):
+            if priority:
+                priority.count_shed()
+            client_writer.write(self.lb.admission.response)
+            client_writer.close()
+            return
+        try:
+            await self._serve_client(client_reader, client_writer)
+        finally:
+            self.lb.admission.release()
+
+    async def _serve_client(self, client_reader, client_writer):
+        request_start = time.time()
+        self.lb._begin_request()
+        addr = client_writer.get_extra_info('peername')
+
+        success = False
+        selected = None
+        priority = None
+        timing = None
+
+        try:
+            if self.lb.pool.all_servers_down():
+                await self.send_error_response(client_writer)
+                self.lb._count_failure()
+                return
+
+            received_at = time.monotonic()
+            request, initial = await self._read_request(client_reader)
+            # Request bytes consumed from the client, resent if a pooled connection turns out stale
+            replay = ReplayBuffer(max(self.lb.config.get('replay_buffer', 65536), len(initial)))
+            replay.record(initial)
+            request_key = self.lb.key_extractor.extract(request, addr) if self.lb.key_extractor else None
+            priority = self.lb.classify(client_writer.get_extra_info('socket'), addr, request)
+            deadline = self.lb.request_deadline(request, received_at)
+            
+            retry_policy = self.lb.retry_policy
+            tried = set()
+            for attempt in range(retry_policy.max_attempts):
+                if self.lb._deadline_expired(deadline):
+                    await self.send_deadline_response(client_writer)
+                    break
+                srv = self.lb._try_acquire_server(request_key, tried)
+                if not srv and self.lb.pool.get_healthy_servers():
+                    # Every backend is at its limit: wait in the dispatch queue off the event loop
+                    srv = await asyncio.get_running_loop().run_in_executor(
+                        self.lb.executor, partial(self.lb.acquire_server, request_key, deadline, priority, tried))
+                if not srv:
+                    if self.lb._deadline_expired(deadline):
+                        await self.send_deadline_response(client_writer)
+                    else:
+                        await self.send_error_response(client_writer)
+                        self.lb._count_failure()
+                    break
+
+                selected = srv
+                tried.add((srv.host, srv.port))
+                timing = RequestTiming()
+                ok = False
+                retry = False
+                result = None
+
+                try:
+                    result = await self.handle_connection(client_reader, client_writer, srv.host, srv.port,
+                                                          replay, timing)
+                    ok = result == RELAYED
+                    if ok:
+                        success = True
+                        self.lb._count_success()
+                        break
+                    if result == CLIENT_ABORTED:
+                        break  # The client hung up mid-request: nothing to retry, and not the backend's fault
+
+                    # The backend failed before answering; replay.data holds whatever reached it
+                    self.lb.pool.mark_unhealthy(srv.host, srv.port)
+                    retry = result == RETRYABLE and retry_policy.should_retry(
+                        attempt, bool(replay.data), request_method(replay.data))
+                    if not retry:
+                        await self.send_error_response(client_writer)
+                except Exception as e:
+                    print(f"Proxy error to {srv.key}: {e}")
+                    self.lb.pool.mark_unhealthy(srv.host, srv.port)
+                finally:
+                    # A client abort says nothing about the backend's latency
+                    rtt = None if result == CLIENT_ABORTED else time.monotonic() - timing.dispatched
+                    self.lb.pool.release(srv, rtt, ok)
+
+                if not retry:
+                    self.lb._count_failure()
+                    break
+                # Jittered backoff without holding a thread
+                await asyncio.sleep(retry_policy.backoff(attempt, deadline))
+        finally:
+            self.lb._finish_request(addr, selected, success, request_start, priority,
+                                    timing if success else None)
+            client_writer.close()
+
+    async def _read_request(self, client_reader):
+        """
+        Returns (request, initial_bytes). When a request key or priority class
+        needs the HTTP head, it is consumed from the stream and parsed, so
+        those bytes are sent to the backend first. request is None otherwise.
+        """
+        if not self.lb.peeks_http:
+            return None, b''
+
+        try:
+            head = await asyncio.wait_for(client_reader.readuntil(HEAD_END), timeout=self.lb.config['timeout'])
+        except asyncio.IncompleteReadError as e:
+            return None, e.partial
+        except asyncio.LimitOverrunError as e:
+            return None, await client_reader.read(e.consumed)
+        except asyncio.TimeoutError:
+            return None, b''
+        try:
+            return parse_request(head), head
+        except HttpError:
+            return None, head
+
+    async def handle_connection(self, client_reader, client_writer, server_host, server_port, replay=None,
+                                timing=None):
+        """
+        Relay the client through the backend, sending the request bytes held
+        in `replay` (a ReplayBuffer) first. Returns one of NetworkProxy's
+        results: RETRYABLE when the backend was unreachable or failed before
+        answering while `replay` still holds the whole request, so the
+        client is free to try another.
+        """
+        replay = replay if replay is not None else ReplayBuffer()
+        pooled = None
+        if self.lb.proxy.connection_pool:
+            pooled = self.lb.proxy.connection_pool.acquire(server_host, server_port, connect=False)
+        try:
+            if pooled:
+                server_reader, server_writer = await asyncio.open_connection(sock=pooled)
+            else:
+                server_reader, server_writer = await self._connect(server_host, server_port)
+        except (OSError, asyncio.TimeoutError):
+            return RETRYABLE
+        if timing is not None:
+            timing.connected = time.monotonic()
+
+        activity = [time.monotonic()]  # Shared so either direction keeps the relay alive
+        exchange = ExchangeTracker() if self.lb.proxy.response_framing else None
+        complete = asyncio.Event()
+
+        def from_client(data):
+            if exchange is not None:
+                exchange.from_client(data)
+            if timing is not None:
+                timing.mark_sent()
+
+        def from_server(data):
+            if exchange is not None:
+                exchange.from_server(data)
+            if timing is not None:
+                timing.mark_first_byte()
+
+        try:
+            if replay.data:
+                server_writer.write(replay.data)
+                from_client(replay.data)
+            if replay.client_eof:
+                server_writer.write_eof()
+            first = await self._first_response(client_reader, server_reader, server_writer, replay, from_client)
+            if first is None and pooled and replay.replayable:
+                # The backend closed the idle connection just as the pool handed it out: resend on a fresh one
+                server_writer.close()
+                try:
+                    server_reader, server_writer = await self._connect(server_host, server_port)
+                except (OSError, asyncio.TimeoutError):
+                    server_writer = None
+                    return unanswered_result(replay, exchange)
+                server_writer.write(replay.data)
+                if replay.client_eof:
+                    server_writer.write_eof()
+                first = await self._first_response(client_reader, server_reader, server_writer, replay, from_client)
+            if first is None:
+                return unanswered_result(replay, exchange)
+            if first:
+                from_server(first)
+                client_writer.write(first)
+                await client_writer.drain()
+                if exchange is not None and exchange.complete:
+                    if timing is not None:
+                        timing.last_byte = time.monotonic()
+                    return RELAYED
+            relay = asyncio.gather(
+                self._pipe(client_reader, server_writer, activity, from_client, exchange, complete),
+                self._pipe(server_reader, client_writer, activity, from_server, exchange, complete),
+            )
+            if exchange is None:
+                await relay
+            else:
+                await self._until_complete(relay, complete)
+            if timing is not None:
+                timing.last_byte = time.monotonic()
+            return RELAYED
+        finally:
+            if server_writer is not None:
+                server_writer.close()
+
+    async def _connect(self, server_host, server_port):
+        return await asyncio.wait_for(asyncio.open_connection(server_host, server_port),
+                                      timeout=self.lb.config['timeout'])
+
+    async def _first_response(self, client_reader, server_reader, server_writer, replay, on_client_data):
+        """
+        Relay the request until the backend answers, recording it in
+        `replay`. Returns the first response bytes, b'' when the backend is
+        slow and the relay should simply carry on, or None when the backend
+        closed the connection before answering.
+        """
+        client_read = None
+        server_read = asyncio.ensure_future(server_reader.read(self.buffer_size))
+        try:
+            while True:
+                if client_read is None and not replay.client_eof:
+                    client_read = asyncio.ensure_future(client_reader.read(self.buffer_size))
+                pending = {server_read} if client_read is None else {server_read, client_read}
+                done, _ = await asyncio.wait(pending, timeout=self.idle_timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    return b''  # Idle; the relay applies its own timeout from here
+
+                if client_read in done:
+                    try:
+                        data = client_read.result()
+                    except OSError:
+                        data = b''  # A broken client connection ends the request like a close
+                    client_read = None
+                    try:
+                        if not data:
+                            replay.client_eof = True
+                            server_writer.write_eof()
+                        else:
+                            replay.record(data)
+                            server_writer.write(data)
+                            on_client_data(data)
+                            await server_writer.drain()
+                    except OSError:
+                        return None
+
+                if server_read in done:
+                    try:
+                        data = server_read.result()
+                    except OSError:
+                        data = b''
+                    return data or None
+        finally:
+            for task in (client_read, server_read):
+                if task is not None and not task.done():
+                    task.cancel()
+                    try:
+                        await task
+                    except (asyncio.CancelledError, OSError):
+                        pass
+
+    async def _until_complete(self, relay, complete):
+        """Finish at the end of the last response rather than when someone closes"""
+        finished = asyncio.ensure_future(complete.wait())
+        await asyncio.wait({relay, finished}, return_when=asyncio.FIRST_COMPLETED)
+        finished.cancel()
+        if relay.done():
+            relay.result()  # Surface relay errors as before
+            return
+        relay.cancel()
+        try:
+            await relay
+        except asyncio.CancelledError:
+            pass
+
+    async def _pipe(self, reader, writer, activity, on_data=None, exchange=None, complete=None):
+        """
+        Copy one direction until EOF or idle timeout, propagating half-close.
+        on_data(data) sees every chunk read. With an ExchangeTracker,
+        `complete` is set once every response has been delivered.
+        """
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(self.buffer_size), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - activity[0] < self.idle_timeout:
+                        continue  # The other direction is still moving data
+                    raise
+                if not data:
+                    break
+                activity[0] = time.monotonic()
+                if on_data:
+                    on_data(data)
+                writer.write(data)
+                await writer.drain()  # Stop reading while the peer is slow
+                if exchange is not None and exchange.complete:
+                    complete.set()
+                    return
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (OSError, asyncio.TimeoutError):
+            writer.close()
+
+    async def send_deadline_response(self, writer):
+        try:
+            writer.write(b"HTTP/1.1 504 Gateway Timeout\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+        except OSError:
+            pass
+
+    async def send_error_response(self, writer):
+        try:
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\n\r\nService Unavailable")
+            await writer.drain()
+        except OSError:
+            pass
@@ -0,0 +1,62 @@
+import math
+
+
+class GradientLimit:
+    """
+    Adaptive in-flight limit for one backend, learned from latency
+
+    Each completed request's round-trip time is compared with a slow moving
+    average of RTT (the backend's usual latency, so workloads that mix fast
+    and slow requests are not mistaken for overload). While RTTs stay within
+    `tolerance` of it the limit grows by about sqrt(limit) per sample; as
+    queueing inflates RTT the gradient baseline/rtt falls below 1 and pulls
+    the limit down. Failures cut the limit multiplicatively (AIMD backoff).
+    Callers serialize access (ServerPool holds its lock around every call).
+    """
+
+    def __init__(self, initial=20, min_limit=1, max_limit=200, tolerance=1.5,
+                 smoothing=0.2, backoff=0.9, window=100):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.window = window
+
+        self.long_rtt = None  # EWMA over roughly `window` samples
+        self.short_rtt = None
+        self.rejected = 0  # Dispatches refused because the backend was at its limit
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+    def on_sample(self, rtt, in_flight, success=True):
+        """Feed one finished request; in_flight counts it as still running"""
+        if not success:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            return
+
+        if self.long_rtt is None:
+            self.long_rtt = self.short_rtt = rtt
+        self.long_rtt += (rtt - self.long_rtt) / self.window
+        self.short_rtt += (rtt - self.short_rtt) * 0.2
+        if self.long_rtt > 2 * self.short_rtt:
+            self.long_rtt *= 0.95  # Load dropped off: let the baseline come back down quickly
+
+        if in_flight < self.limit / 2:
+            return  # Not using the limit, so the sample says nothing about raising it
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / max(self.short_rtt, 1e-6)))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = (1 - self.smoothing) * self.limit + self.smoothing * target
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def get_stats(self):
+        return {
+            'limit': self.current,
+            'rtt_ms': round(self.short_rtt * 1000, 2) if self.short_rtt is not None else None,
+            'baseline_rtt_ms': round(self.long_rtt * 1000, 2) if self.long_rtt is not None else None,
+            'rejected': self.rejected
+        }
@@ -0,0 +1,217 @@
+import select
+import socket
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+
+
+class _PooledConnection:
+    __slots__ = ('sock', 'created', 'last_used')
+
+    def __init__(self, sock, created):
+        self.sock = sock
+        self.created = created
+        self.last_used = created
+
+
+class BackendConnectionPool:
+    """
+    Per-backend pool of idle keep-alive connections
+
+    Connections are opened ahead of time (at startup, when a backend is added
+    and after every hit) so a client usually gets a backend socket that has
+    already finished its handshake. Idle connections are evicted after
+    max_idle seconds, after max_lifetime seconds, when the peer has closed
+    them, or when the backend is marked unhealthy in the ServerPool.
+    """
+
+    def __init__(self, server_pool, pool_size=10, max_idle=30.0, max_lifetime=300.0, connect_timeout=3):
+        self.server_pool = server_pool
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.connect_timeout = connect_timeout
+
+        self.idle = defaultdict(deque)  # "host:port" -> deque of _PooledConnection (newest on the right)
+        self.backends = {}  # "host:port" -> (host, port) to keep warm
+        self.created = weakref.WeakKeyDictionary()  # socket -> connect time, for max_lifetime
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.running = False
+        self.maintenance_thread = None
+        self._refill = threading.Event()
+
+    def add_backend(self, host, port):
+        """Register a backend to keep warm and schedule pre-warming"""
+        with self.lock:
+            self.backends[f"{host}:{port}"] = (host, port)
+        self._refill.set()
+
+    def remove_backend(self, host, port):
+        key = f"{host}:{port}"
+        with self.lock:
+            self.backends.pop(key, None)
+        self.evict(host, port)
+
+    def acquire(self, host, port, connect=True):
+        """
+        Return a connected socket to the backend, reusing an idle one if possible.
+        With connect=False only idle connections are considered (never blocks).
+        """
+        key = f"{host}:{port}"
+        now = time.time()
+        with self.lock:
+            idle = self.idle.get(key)
+            while idle:
+                conn = idle.pop()  # Most recently used first: least likely to have been closed
+                if self._usable(conn, now):
+                    self.hits += 1
+                    self._refill.set()
+                    return conn.sock
+                self.evictions += 1
+                _close(conn.sock)
+            self.misses += 1
+
+        if not connect:
+            return None
+        return self._connect(host, port)
+
+    def release(self, host, port, sock):
+        """Return a connection that is idle and clean (no unread response bytes)"""
+        key = f"{host}:{port}"
+        now = time.time()
+        with self.lock:
+            idle = self.idle[key]
+            if key in self.backends and len(idle) < self.pool_size and _is_idle_and_open(sock):
+                conn = _PooledConnection(sock, self.created.get(sock, now))
+                conn.last_used = now
+                idle.append(conn)
+                return
+        _close(sock)
+
+    def evict(self, host, port):
+        """Drop all idle connections to a backend (e.g. when it turns unhealthy)"""
+        with self.lock:
+            idle = self.idle.pop(f"{host}:{port}", None)
+            if idle:
+                self.evictions += len(idle)
+        for conn in idle or ():
+            _close(conn.sock)
+
+    def start_maintenance(self):
+        if self.running:
+            return
+        self.running = True
+        self._refill.set()  # Pre-warm every registered backend right away
+        self.maintenance_thread = threading.Thread(target=self._maintenance_loop, daemon=True)
+        self.maintenance_thread.start()
+
+    def stop_maintenance(self):
+        self.running = False
+        self._refill.set()
+        if self.maintenance_thread and self.maintenance_thread.is_alive():
+            self.maintenance_thread.join(timeout=2)
+        with self.lock:
+            pools = list(self.idle.values())
+            self.idle.clear()
+        for idle in pools:
+            for conn in idle:
+                _close(conn.sock)
+
+    def _maintenance_loop(self):
+        while self.running:
+            self._refill.wait(timeout=1.0)
+            self._refill.clear()
+            if not self.running:
+                break
+            self._evict_stale()
+            self._top_up()
+
+    def _evict_stale(self):
+        now = time.time()
+        stale = []
+        with self.lock:
+            for key, idle in list(self.idle.items()):
+                host, port = self.backends.get(key, (None, None))
+                srv = self.server_pool.get_server_info(host, port) if host else None
+                if srv is None or not srv.healthy:
+                    stale.extend(idle)
+                    del self.idle[key]
+                    continue
+                keep = deque()
+                for conn in idle:
+                    (keep if self._usable(conn, now) else stale).append(conn)
+                self.idle[key] = keep
+            self.evictions += len(stale)
+        for conn in stale:
+            _close(conn.sock)
+
+    def _top_up(self):
+        with self.lock:
+            backends = list(self.backends.values())
+        for host, port in backends:
+            srv = self.server_pool.get_server_info(host, port)
+            if srv is None or not srv.healthy:
+                continue
+            key = f"{host}:{port}"
+            while self.running:
+                with self.lock:
+                    if len(self.idle[key]) >= self.pool_size:
+                        break
+                sock = self._connect(host, port)
+                if sock is None:
+                    break  # Health monitor decides whether the backend is down
+                self.release(host, port, sock)
+
+    def _usable(self, conn, now):
+        if now - conn.last_used > self.max_idle:
+            return False
+        if now - conn.created > self.max_lifetime:
+            return False
+        return _is_idle_and_open(conn.sock)
+
+    def _connect(self, host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.settimeout(self.connect_timeout)
+            sock.connect((host, port))
+        except OSError:
+            _close(sock)
+            return None
+        with self.lock:
+            self.created[sock] = time.time()
+        return sock
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits / max(lookups, 1)) * 100, 1),
+                'evictions': self.evictions,
+                'idle_connections': sum(len(idle) for idle in self.idle.values())
+            }
+
+
+def _is_idle_and_open(sock):
+    """True if the peer has not closed the connection and sent nothing unread"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    # Readable while idle means EOF, a reset, or stray bytes we must not hand to the next request
+    return not readable
+
+
+def _close(sock):
+    try:
+        sock.close()
+    except OSError:
+        pass
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+
+
+class _Waiter:
+    __slots__ = ('event', 'deadline', 'enqueued_at', 'priority', 'evicted')
+
+    def __init__(self, deadline, priority):
+        self.event = threading.Event()
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.priority = priority  # PriorityClass, or None without classification
+        self.evicted = False
+
+
+class DispatchQueue:
+    """
+    Central wait queue for requests that find every backend saturated
+
+    A request that cannot be dispatched right away parks here until a
+    backend frees capacity (ServerPool calls notify() whenever a connection
+    slot is released) or its deadline passes. Waiters are woken oldest first;
+    once more than `lifo_depth` are waiting the newest is woken instead, since
+    the oldest are the likeliest to miss their deadline anyway. The queue is
+    bounded at `max_depth`; requests beyond it fail immediately.
+
+    With priority classes, freed slots are shared between the waiting classes
+    in proportion to their weights (stride scheduling), and a full queue makes
+    room for a new request by evicting a waiter of a lower class.
+    """
+
+    def __init__(self, max_depth=100, timeout=1.0, lifo_depth=None):
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.lifo_depth = lifo_depth if lifo_depth is not None else max(1, max_depth // 2)
+        self.waiters = deque()
+        self.lock = threading.Lock()
+        self.passes = {}  # Per-class virtual time for weighted fair wake-ups
+        self.vtime = 0.0
+
+        self.enqueued = 0
+        self.dispatched = 0
+        self.timed_out = 0
+        self.rejected_full = 0
+        self.lifo_wakeups = 0
+        self.total_wait = 0.0
+
+    def acquire(self, select, deadline=None, priority=None):
+        """
+        Return select()'s result as soon as it is not None, waiting for freed
+        capacity if needed. A request waits at most `timeout` seconds, or
+        until its own `deadline` (a time.monotonic() value) if that is sooner.
+        Returns None on timeout or when the queue is full.
+        """
+        result = select()
+        if result is not None:
+            return result
+
+        latest = time.monotonic() + self.timeout
+        deadline = latest if deadline is None else min(deadline, latest)
+        waiter = _Waiter(deadline, priority)
+        with self.lock:
+            if len(self.waiters) >= self.max_depth and not self._evict_below(priority):
+                self.rejected_full += 1
+                _count_shed(priority)
+                return None
+            self.waiters.append(waiter)
+            self.enqueued += 1
+
+        try:
+            while True:
+                if waiter.evicted:
+                    return None  # Displaced by a higher priority request
+                # Clear before selecting: a slot freed after select() sets the event again, so it is not lost
+                waiter.event.clear()
+                result = select()
+                if result is not None:
+                    with self.lock:
+                        self.dispatched += 1
+                        self.total_wait += time.monotonic() - waiter.enqueued_at
+                    return result
+                # No slot yet, or someone else took it; keep our place and wait for the next one
+                remaining = waiter.deadline - time.monotonic()
+                if remaining <= 0:
+                    with self.lock:
+                        self.timed_out += 1
+                    _count_shed(priority)
+                    return None
+                waiter.event.wait(remaining)
+        finally:
+            with self.lock:
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def notify(self):
+        """A backend slot was freed: wake one waiter that is not already awake"""
+        with self.lock:
+            candidates = [w for w in self.waiters if not w.event.is_set()]
+            if not candidates:
+                return
+            group = self._pick_class(candidates)
+            overloaded = len(self.waiters) > self.lifo_depth
+            group[-1 if overloaded else 0].event.set()
+            if overloaded:
+                self.lifo_wakeups += 1
+
+    def _pick_class(self, candidates):
+        """Waiters of the class whose turn it is; each class's pass advances by 1/weight per wake-up"""
+        by_class = {}
+        for waiter in candidates:
+            by_class.setdefault(waiter.priority, []).append(waiter)
+        if len(by_class) == 1:
+            return candidates
+
+        # A class that was idle starts at the current virtual time rather than banking credit
+        def start(priority):
+            return max(self.passes.get(priority, 0.0), self.vtime)
+
+        chosen = min(by_class, key=lambda priority: (start(priority), priority.rank if priority else 0))
+        self.vtime = start(chosen)
+        weight = chosen.weight if chosen is not None else 1
+        self.passes[chosen] = self.vtime + 1.0 / weight
+        return by_class[chosen]
+
+    def _evict_below(self, priority):
+        """Drop the newest waiter of the lowest class ranked below `priority`; True if one was dropped"""
+        if priority is None:
+            return False
+        victim = None
+        for waiter in self.waiters:
+            if waiter.event.is_set() or waiter.priority is None:
+                continue  # Already woken for a freed slot
+            if waiter.priority.rank > priority.rank:
+                if victim is None or waiter.priority.rank >= victim.priority.rank:
+                    victim = waiter
+        if victim is None:
+            return False
+        self.waiters.remove(victim)
+        victim.evicted = True
+        victim.event.set()
+        self.rejected_full += 1
+        _count_shed(victim.priority)
+        return True
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'depth': len(self.waiters),
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'dispatched': self.dispatched,
+                'timed_out': self.timed_out,
+                'rejected_full': self.rejected_full,
+                'lifo_wakeups': self.lifo_wakeups,
+                'avg_wait_ms': round(self.total_wait / max(self.dispatched, 1) * 1000, 2)
+            }
+
+
+def _count_shed(priority):
+    if priority is not None:
+        priority.count_shed()
@@ -0,0 +1,222 @@
+import select
+import threading
+import time
+from collections import deque
+
+from .http_parser import HttpError, ConnectionClosed, FRAMING_NONE, IDEMPOTENT_METHODS
+from .http_proxy import CONNECT_FAILED, NO_RESPONSE
+
+
+class HedgeBudget:
+    """
+    Token bucket capping hedges at a fraction of traffic: every primary
+    request earns `ratio` tokens, every hedge spends one, and at most `burst`
+    tokens can be saved up.
+    """
+
+    def __init__(self, ratio=0.05, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.lock = threading.Lock()
+
+    def on_request(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def try_spend(self):
+        with self.lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+class _Leg:
+    __slots__ = ('srv', 'backend', 'sent_at', 'is_hedge')
+
+    def __init__(self, srv, backend, is_hedge):
+        self.srv = srv
+        self.backend = backend
+        self.sent_at = time.monotonic()
+        self.is_hedge = is_hedge
+
+
+class HedgedDispatcher:
+    """
+    Tied/hedged dispatch for idempotent L7 requests
+
+    The request goes to the primary backend first. A duplicate goes to a
+    backup backend immediately when the strategy predicts the primary will
+    miss its SLO (ALPHA1Strategy.should_hedge), or once the primary has been
+    silent for the p95 of recent time-to-response-head. Whichever backend
+    starts answering first wins; the other leg is closed, which cancels it.
+    HedgeBudget caps the extra backend load.
+    """
+
+    def __init__(self, http_proxy, server_pool, budget, delay_percentile=0.95, min_delay_ms=5, min_samples=20):
+        self.http_proxy = http_proxy
+        self.pool = server_pool
+        self.budget = budget
+        self.delay_percentile = delay_percentile
+        self.min_delay = min_delay_ms / 1000.0
+        self.min_samples = min_samples
+
+        self.latencies = deque(maxlen=1000)  # Seconds from request sent to response head
+        self.lock = threading.Lock()
+        self._delay = None
+        self._median_ms = 0.0
+        self._samples_since_update = 0
+
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.cancelled = 0
+        self.budget_denied = 0
+
+    @staticmethod
+    def eligible(request):
+        """Only bodyless idempotent requests can be duplicated safely"""
+        return request.method in IDEMPOTENT_METHODS and request.framing == FRAMING_NONE
+
+    def forward(self, client, request, primary, strategy, pick_backup, timing=None):
+        """
+        Dispatch with hedging. `pick_backup()` returns another Backend or
+        None and is only called when a hedge is actually sent. `timing` (a
+        RequestTiming) records the winning leg. When a hedge wins, the
+        caller's primary was cancelled and should be released without a
+        latency sample.
+        Returns (outcome, keep_alive, winning_server).
+        """
+        self.budget.on_request()
+
+        primary_leg = self._launch(request, primary, is_hedge=False)
+        if primary_leg is None:
+            return CONNECT_FAILED, False, primary
+        legs = [primary_leg]
+
+        hedge_delay = self._hedge_delay()
+        if self._predicted_slow(strategy, primary):
+            hedge_delay = 0.0
+        hedge_pending = hedge_delay is not None
+
+        try:
+            while legs:
+                if hedge_pending:
+                    timeout = max(0.0, primary_leg.sent_at + hedge_delay - time.monotonic())
+                else:
+                    timeout = self.http_proxy.idle_timeout
+                readable, _, _ = select.select([leg.backend.sock for leg in legs], [], [], timeout)
+
+                if not readable:
+                    if not hedge_pending:
+                        break  # Every leg went silent
+                    hedge_pending = False
+                    self._send_hedge(request, legs, pick_backup)
+                    continue
+
+                leg = next(l for l in legs if l.backend.sock is readable[0])
+                try:
+                    response = leg.backend.read_response(request.method)
+                except (HttpError, ConnectionClosed, OSError):
+                    legs.remove(leg)
+                    self._close_leg(leg)
+                    continue
+
+                # First response wins: cancel the others before relaying
+                cancelled = [other for other in legs if other is not leg]
+                for other in cancelled:
+                    self._close_leg(other)
+                legs = []
+
+                self._record_latency(time.monotonic() - leg.sent_at)
+                with self.lock:
+                    self.cancelled += len(cancelled)
+                    if leg.is_hedge:
+                        self.hedge_wins += 1
+                if timing is not None:
+                    timing.connected = timing.request_sent = leg.sent_at
+                    timing.mark_first_byte()
+
+                reusable = False
+                try:
+                    outcome, keep_alive, reusable = self.http_proxy.relay_response(client, request, leg.backend, response)
+                    if timing is not None:
+                        timing.last_byte = time.monotonic()
+                    return outcome, keep_alive, leg.srv
+                finally:
+                    self._close_leg(leg, reusable)
+            return NO_RESPONSE, False, primary
+        finally:
+            for leg in legs:
+                self._close_leg(leg)
+
+    def _send_hedge(self, request, legs, pick_backup):
+        if not self.budget.try_spend():
+            with self.lock:
+                self.budget_denied += 1
+            return
+        backup = pick_backup()
+        if not backup:
+            return
+        leg = self._launch(request, backup, is_hedge=True)
+        if leg:
+            legs.append(leg)
+            with self.lock:
+                self.hedges_sent += 1
+
+    def _launch(self, request, srv, is_hedge):
+        # The caller accounts for the primary; the hedge leg is ours and respects the backend's limit
+        if is_hedge and not self.pool.try_acquire(srv):
+            return None
+        backend = self.http_proxy.open_backend(srv.host, srv.port)
+        if backend is not None:
+            try:
+                backend.sock.sendall(request.head)
+                return _Leg(srv, backend, is_hedge)
+            except OSError:
+                self.http_proxy.close_backend(srv.host, srv.port, backend)
+        if is_hedge:
+            self.pool.release(srv)
+        return None
+
+    def _close_leg(self, leg, reusable=False):
+        if leg.backend is None:
+            return
+        self.http_proxy.close_backend(leg.srv.host, leg.srv.port, leg.backend, reusable)
+        leg.backend = None
+        if leg.is_hedge:
+            self.pool.release(leg.srv)
+
+    def _predicted_slow(self, strategy, primary):
+        should_hedge = getattr(strategy, 'should_hedge', None)
+        if should_hedge is None or len(self.latencies) < self.min_samples:
+            return False
+        return should_hedge(primary, self._median_ms)
+
+    def _hedge_delay(self):
+        """p95 time-to-response-head, or None until there is enough data"""
+        with self.lock:
+            return self._delay
+
+    def _record_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self._samples_since_update += 1
+            # Percentiles are recomputed periodically, not per request
+            if len(self.latencies) >= self.min_samples and (self._delay is None or self._samples_since_update >= 50):
+                ordered = sorted(self.latencies)
+                index = min(int(len(ordered) * self.delay_percentile), len(ordered) - 1)
+                self._delay = max(ordered[index], self.min_delay)
+                self._median_ms = ordered[len(ordered) // 2] * 1000
+                self._samples_since_update = 0
+
+    def get_stats(self):
+        with self.lock:
+            delay = self._delay
+            return {
+                'hedges_sent': self.hedges_sent,
+                'hedge_wins': self.hedge_wins,
+                'cancelled': self.cancelled,
+                'budget_denied': self.budget_denied,
+                'hedge_delay_ms': round(delay * 1000, 2) if delay is not None else None
+            }
@@ -0,0 +1,96 @@
+import os
+import socket
+import threading
+
+HANDOFF_MESSAGE = b'listener'
+
+
+def receive_listener(path, timeout=5.0):
+    """
+    Ask the load balancer serving handoffs at the Unix socket `path` for its
+    listening socket. Returns the inherited socket, or None when nothing
+    answers there (first start, or a stale path).
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(path)
+            msg, fds, _, _ = socket.recv_fds(conn, 64, 1)
+    except OSError as e:
+        print(f"No listener handed off at {path}: {e}")
+        return None
+    if msg != HANDOFF_MESSAGE or not fds:
+        for fd in fds:
+            os.close(fd)
+        return None
+    return socket.socket(fileno=fds[0])
+
+
+class HandoffServer:
+    """
+    Hands this process's listening socket to its successor for a hot restart
+
+    The new process connects to the Unix socket at `path` (receive_listener)
+    and is sent the listener's file descriptor with SCM_RIGHTS. Both then
+    share one kernel socket, so connections queued during the restart are
+    never refused. Once the descriptor is sent, on_handoff() is called on
+    the handoff thread so the old process can stop accepting and drain. The
+    path is released before the handoff so the successor can bind it for
+    the next restart.
+    """
+
+    def __init__(self, path, listener, on_handoff):
+        self.path = path
+        self.listener = listener
+        self.on_handoff = on_handoff
+        self.sock = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        try:
+            os.unlink(self.path)  # Left behind by a process that did not exit cleanly
+        except FileNotFoundError:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(1)
+        self.sock.settimeout(1.0)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name="handoff", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _serve(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return  # Closed by stop()
+
+            with conn:
+                self.stop()
+                try:
+                    socket.send_fds(conn, [HANDOFF_MESSAGE], [self.listener.fileno()])
+                except OSError as e:
+                    print(f"Listener handoff failed: {e}")
+                    self.start()  # Keep serving; a later successor can try again
+                    continue
+            self.on_handoff()
+            return
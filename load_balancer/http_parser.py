@@ -0,0 +1,461 @@
+import select
+import socket
+import time
+from collections import deque
+
+MAX_HEAD_SIZE = 65536
+CRLF = b'\r\n'
+HEAD_END = b'\r\n\r\n'
+
+# Body framing kinds
+FRAMING_NONE = 'none'
+FRAMING_LENGTH = 'length'
+FRAMING_CHUNKED = 'chunked'
+FRAMING_CLOSE = 'close'  # Response body runs until the backend closes
+
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'))
+
+
+class HttpError(Exception):
+    """Malformed or oversized HTTP/1.x message"""
+
+
+class ConnectionClosed(Exception):
+    """Peer closed the connection; `partial` tells whether it was mid-message"""
+
+    def __init__(self, partial=False):
+        super().__init__("connection closed mid-message" if partial else "connection closed")
+        self.partial = partial
+
+
+class HttpMessage:
+    """Parsed start line and headers of one request or response"""
+
+    __slots__ = ('head', 'start_line', 'headers', 'method', 'target', 'version',
+                 'status', 'framing', 'content_length')
+
+    def __init__(self, head):
+        self.head = head
+        lines = head[:-4].decode('latin-1').split('\r\n')
+        self.start_line = lines[0]
+        self.headers = []
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if not sep:
+                raise HttpError(f"bad header line: {line!r}")
+            self.headers.append((name.strip(), value.strip()))
+        self.method = None
+        self.target = None
+        self.version = None
+        self.status = None
+        self.framing = FRAMING_NONE
+        self.content_length = 0
+
+    def header(self, name, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def has_token(self, name, token):
+        """True if a comma-separated header such as Connection contains token"""
+        value = self.header(name)
+        if not value:
+            return False
+        return token in (part.strip().lower() for part in value.split(','))
+
+    def set_header(self, name, value):
+        """Replace (or add) a header, rewriting the raw head that gets forwarded"""
+        lname = name.lower()
+        self.headers = [(k, v) for k, v in self.headers if k.lower() != lname]
+        self.headers.append((name, value))
+        lines = [line for line in self.head[:-4].split(CRLF)[1:]
+                 if line.split(b':', 1)[0].strip().lower() != lname.encode('latin-1')]
+        lines.append(f"{name}: {value}".encode('latin-1'))
+        self.head = CRLF.join([self.start_line.encode('latin-1')] + lines) + HEAD_END
+
+    @property
+    def keep_alive(self):
+        if self.version == 'HTTP/1.0':
+            return self.has_token('Connection', 'keep-alive')
+        return not self.has_token('Connection', 'close')
+
+    def _set_body_framing(self):
+        if self.has_token('Transfer-Encoding', 'chunked'):
+            self.framing = FRAMING_CHUNKED
+            return True
+        length = self.header('Content-Length')
+        if length is not None:
+            try:
+                self.content_length = int(length)
+            except ValueError:
+                raise HttpError(f"bad Content-Length: {length!r}")
+            self.framing = FRAMING_LENGTH if self.content_length > 0 else FRAMING_NONE
+            return True
+        return False
+
+
+def parse_request(head):
+    msg = HttpMessage(head)
+    parts = msg.start_line.split(' ')
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise HttpError(f"bad request line: {msg.start_line!r}")
+    msg.method, msg.target, msg.version = parts
+    msg._set_body_framing()
+    return msg
+
+
+def parse_response(head, request_method=None):
+    msg = HttpMessage(head)
+    parts = msg.start_line.split(' ', 2)
+    if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+        raise HttpError(f"bad status line: {msg.start_line!r}")
+    msg.version = parts[0]
+    try:
+        msg.status = int(parts[1])
+    except ValueError:
+        raise HttpError(f"bad status code: {parts[1]!r}")
+
+    # Responses that never carry a body regardless of their headers
+    if request_method == 'HEAD' or msg.status < 200 or msg.status in (204, 304):
+        return msg
+    if not msg._set_body_framing():
+        msg.framing = FRAMING_CLOSE
+    return msg
+
+
+def peek_request(sock, timeout):
+    """
+    Parse the request head at the front of an L4 client socket without
+    consuming it, so the relay still forwards every byte. Returns None if the
+    stream is not HTTP or the head does not arrive within timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        readable, _, _ = select.select([sock], [], [], remaining)
+        if not readable:
+            return None
+        try:
+            data = sock.recv(MAX_HEAD_SIZE, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        except OSError:
+            return None
+        end = data.find(HEAD_END)
+        if end >= 0:
+            try:
+                return parse_request(data[:end + 4])
+            except HttpError:
+                return None
+        if not data or len(data) >= MAX_HEAD_SIZE:
+            return None
+        time.sleep(0.005)  # Partial head: peeking again would return the same bytes at once
+
+
+class HttpStream:
+    """
+    Buffered reader over a blocking socket that understands HTTP/1.1 message
+    framing. Bodies are forwarded in wire format (chunk framing included), so
+    the proxy never re-encodes a message.
+    """
+
+    def __init__(self, sock, buffer_size=4096):
+        self.sock = sock
+        self.buffer_size = buffer_size
+        self.buf = bytearray()
+
+    def _fill(self, partial):
+        data = self.sock.recv(self.buffer_size)
+        if not data:
+            raise ConnectionClosed(partial)
+        self.buf += data
+
+    def read_head(self):
+        """Read up to and including the blank line; None on clean EOF between messages"""
+        while True:
+            end = self.buf.find(HEAD_END)
+            if end >= 0:
+                head = bytes(self.buf[:end + 4])
+                del self.buf[:end + 4]
+                return head
+            if len(self.buf) > MAX_HEAD_SIZE:
+                raise HttpError("header section too large")
+            try:
+                self._fill(partial=bool(self.buf))
+            except ConnectionClosed as e:
+                if not e.partial:
+                    return None
+                raise
+
+    def read_request(self):
+        head = self.read_head()
+        return parse_request(head) if head is not None else None
+
+    def read_response(self, request_method=None):
+        head = self.read_head()
+        if head is None:
+            raise ConnectionClosed(partial=False)
+        return parse_response(head, request_method)
+
+    def forward_body(self, msg, dst_sock):
+        """Copy msg's body to dst_sock; returns the number of body bytes forwarded"""
+        if msg.framing == FRAMING_LENGTH:
+            return self._forward_length(msg.content_length, dst_sock)
+        if msg.framing == FRAMING_CHUNKED:
+            return self._forward_chunked(dst_sock)
+        if msg.framing == FRAMING_CLOSE:
+            return self._forward_until_close(dst_sock)
+        return 0
+
+    def _forward_length(self, remaining, dst_sock):
+        total = remaining
+        while remaining > 0:
+            if not self.buf:
+                self._fill(partial=True)
+            take = min(remaining, len(self.buf))
+            dst_sock.sendall(self.buf[:take])
+            del self.buf[:take]
+            remaining -= take
+        return total
+
+    def _read_line(self):
+        while True:
+            end = self.buf.find(CRLF)
+            if end >= 0:
+                line = bytes(self.buf[:end + 2])
+                del self.buf[:end + 2]
+                return line
+            if len(self.buf) > MAX_HEAD_SIZE:
+                raise HttpError("chunk line too long")
+            self._fill(partial=True)
+
+    def _forward_chunked(self, dst_sock):
+        total = 0
+        while True:
+            line = self._read_line()
+            dst_sock.sendall(line)
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise HttpError(f"bad chunk size: {line!r}")
+            if size == 0:
+                # Trailer section ends with an empty line
+                while True:
+                    trailer = self._read_line()
+                    dst_sock.sendall(trailer)
+                    if trailer == CRLF:
+                        return total
+            self._forward_length(size + 2, dst_sock)  # Chunk data plus its CRLF
+            total += size
+
+    def _forward_until_close(self, dst_sock):
+        total = 0
+        while True:
+            if self.buf:
+                dst_sock.sendall(self.buf)
+                total += len(self.buf)
+                self.buf.clear()
+            try:
+                self._fill(partial=False)
+            except ConnectionClosed:
+                return total
+
+
+
+# FramingTracker states
+_HEAD = 'head'
+_LENGTH = 'length'
+_CHUNK_SIZE = 'chunk_size'
+_CHUNK_DATA = 'chunk_data'
+_TRAILER = 'trailer'
+_UNTIL_CLOSE = 'until_close'
+_OPAQUE = 'opaque'  # Not HTTP/1.x, upgraded or unparseable: boundaries are unknown
+
+
+class FramingTracker:
+    """
+    Follows the HTTP/1.x message boundaries in one direction of an opaque
+    relay. Every chunk is fed as it is forwarded; only start lines, headers
+    and chunk-size lines are looked at, body bytes are just counted, so the
+    payload is never buffered. Response framing depends on the request
+    method (HEAD responses have no body), so a response tracker shares the
+    request tracker's `methods` queue.
+    """
+
+    def __init__(self, is_request, methods=None):
+        self.is_request = is_request
+        self.methods = methods if methods is not None else deque()
+        self.state = _HEAD
+        self.line = bytearray()  # Partial head or chunk line
+        self.remaining = 0
+        self.started = 0  # Message heads seen
+        self.completed = 0  # Messages seen in full
+        self.keep_alive = True  # Of the last message
+
+    @property
+    def opaque(self):
+        return self.state == _OPAQUE
+
+    @property
+    def idle(self):
+        """Between messages: the last one is complete and the next has not begun"""
+        return self.state == _HEAD and not self.line
+
+    def feed(self, data, end=None):
+        """Account for data[:end], the next bytes of the stream"""
+        pos = 0
+        end = len(data) if end is None else end
+        while pos < end:
+            state = self.state
+            if state == _OPAQUE or state == _UNTIL_CLOSE:
+                return
+            if state == _LENGTH or state == _CHUNK_DATA:
+                take = min(self.remaining, end - pos)
+                pos += take
+                self.remaining -= take
+                if not self.remaining:
+                    if state == _LENGTH:
+                        self._message_done()
+                    else:
+                        self.state = _CHUNK_SIZE
+                continue
+
+            # Heads, chunk sizes and trailers are line oriented
+            newline = data.find(b'\n', pos, end)
+            stop = end if newline < 0 else newline + 1
+            self.line += data[pos:stop]
+            pos = stop
+            if len(self.line) > MAX_HEAD_SIZE:
+                self.state = _OPAQUE
+            elif newline >= 0:
+                self._on_line()
+
+    def _on_line(self):
+        line = self.line
+        if self.state == _HEAD:
+            if line == CRLF:
+                line.clear()  # Stray blank line between messages
+            elif line.count(b'\n') == 1 and not self._looks_like_start_line(line):
+                self.state = _OPAQUE
+            elif line.endswith(HEAD_END):
+                head = bytes(line)
+                line.clear()
+                self._on_head(head)
+        elif self.state == _CHUNK_SIZE:
+            try:
+                size = int(bytes(line).split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                self.state = _OPAQUE
+                return
+            line.clear()
+            if size:
+                self.state = _CHUNK_DATA
+                self.remaining = size + 2  # Chunk data plus its CRLF
+            else:
+                self.state = _TRAILER
+        else:
+            # Trailer section: ends with an empty line
+            done = line == CRLF
+            line.clear()
+            if done:
+                self._message_done()
+
+    def _looks_like_start_line(self, line):
+        if self.is_request:
+            return b' HTTP/1.' in line
+        return line.startswith(b'HTTP/1.')
+
+    def _on_head(self, head):
+        method = None
+        try:
+            if self.is_request:
+                msg = parse_request(head)
+            else:
+                method = self.methods[0] if self.methods else None
+                msg = parse_response(head, method)
+        except HttpError:
+            self.state = _OPAQUE
+            return
+
+        if self.is_request:
+            self.methods.append(msg.method)
+        elif msg.status < 200:
+            if msg.status == 101:
+                self.state = _OPAQUE  # Switched protocols: what follows is not HTTP
+            return  # Interim response; the final one follows
+        else:
+            if self.methods:
+                self.methods.popleft()
+            if method == 'CONNECT' and msg.status < 300:
+                self.state = _OPAQUE  # Tunnel established
+                return
+
+        self.started += 1
+        self.keep_alive = msg.keep_alive
+        if msg.framing == FRAMING_LENGTH:
+            self.state = _LENGTH
+            self.remaining = msg.content_length
+        elif msg.framing == FRAMING_CHUNKED:
+            self.state = _CHUNK_SIZE
+        elif msg.framing == FRAMING_CLOSE:
+            self.state = _UNTIL_CLOSE
+            self.keep_alive = False
+        else:
+            self._message_done()
+
+    def _message_done(self):
+        self.state = _HEAD
+        self.completed += 1
+
+
+def request_method(data):
+    """
+    Method that decides whether the requests at the front of an L4 stream
+    may be sent again: the first non-idempotent one among them, else the
+    first. None when `data` does not start with an HTTP/1.x request head.
+    """
+    tracker = FramingTracker(is_request=True)
+    tracker.feed(data)
+    if tracker.opaque or not tracker.methods:
+        return None
+    for method in tracker.methods:
+        if method not in IDEMPOTENT_METHODS:
+            return method
+    return tracker.methods[0]
+
+
+class ExchangeTracker:
+    """
+    Request/response accounting for an HTTP/1.x connection relayed at L4.
+    `complete` is True once every request forwarded so far has been answered
+    in full and the client has not started another, i.e. the relay can end
+    (and the backend connection be reused if `reusable`) without cutting a
+    message short. Streams that are not HTTP/1.x never complete.
+    """
+
+    def __init__(self):
+        self.requests = FramingTracker(is_request=True)
+        self.responses = FramingTracker(is_request=False, methods=self.requests.methods)
+
+    def from_client(self, data, end=None):
+        self.requests.feed(data, end)
+
+    def from_server(self, data, end=None):
+        self.responses.feed(data, end)
+
+    @property
+    def opaque(self):
+        return self.requests.opaque or self.responses.opaque
+
+    @property
+    def complete(self):
+        requests, responses = self.requests, self.responses
+        return (responses.completed > 0 and
+                responses.completed == requests.completed == requests.started and
+                requests.idle and responses.idle)
+
+    @property
+    def reusable(self):
+        return self.complete and self.requests.keep_alive and self.responses.keep_alive
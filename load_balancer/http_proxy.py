@@ -0,0 +1,361 @@
+import socket
+import tempfile
+import threading
+import time
+
+from .http_parser import HttpStream, HttpError, ConnectionClosed, FRAMING_CLOSE, FRAMING_LENGTH, FRAMING_NONE
+
+# Outcomes of forwarding one request
+RESPONSE_OK = 'ok'
+CONNECT_FAILED = 'connect_failed'      # Backend unreachable; nothing was sent
+NO_RESPONSE = 'no_response'            # Backend failed before the first response byte
+RESPONSE_ABORTED = 'response_aborted'  # Failed after response bytes reached the client
+CLIENT_ABORTED = 'client_aborted'      # Client went away while sending its request
+BAD_REQUEST = 'bad_request'            # Client sent a malformed request body
+BODY_TOO_LARGE = 'body_too_large'      # Request body outgrew the request buffer
+
+
+class ResponseSpool:
+    """
+    Sink for a response body that lets the backend go before a slow client
+    has read it. Bytes are kept in memory up to `memory_limit`, then in a
+    temporary file. Past `max_size` the spool stops buffering: it sends what
+    it holds and passes the rest straight through to the client.
+    """
+
+    def __init__(self, client_sock, memory_limit, max_size):
+        self.client_sock = client_sock
+        self.file = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+        self.memory_limit = memory_limit
+        self.max_size = max_size
+        self.size = 0
+        self.peak = 0
+        self.passthrough = False
+
+    def sendall(self, data):
+        if self.passthrough:
+            self.client_sock.sendall(data)
+            return
+        if self.size + len(data) > self.max_size:
+            self.drain()
+            self.passthrough = True
+            self.client_sock.sendall(data)
+            return
+        self.file.write(data)
+        self.size += len(data)
+        self.peak = max(self.peak, self.size)
+
+    def drain(self, chunk_size=65536):
+        """Send everything spooled so far to the client"""
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(chunk_size)
+            if not chunk:
+                break
+            self.client_sock.sendall(chunk)
+        self.file.seek(0)
+        self.file.truncate()
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+
+class BodyTooLarge(HttpError):
+    pass
+
+
+class _BackendSink:
+    """Body destination that tells a failed send to the backend from a failed read from the client"""
+
+    __slots__ = ('sock', 'failed')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.failed = False
+
+    def sendall(self, data):
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            self.failed = True
+            raise
+
+
+class RequestBody:
+    """
+    A request body read in full from the client before a backend is chosen,
+    kept in memory up to `memory_limit` and then in a temporary file. It can
+    be sent any number of times, so the request stays retryable.
+    """
+
+    def __init__(self, memory_limit, max_size):
+        self.file = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+        self.memory_limit = memory_limit
+        self.max_size = max_size
+        self.size = 0
+
+    def sendall(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise BodyTooLarge(f"request body over {self.max_size} bytes")
+        self.file.write(data)
+
+    def send_to(self, sock, chunk_size=65536):
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(chunk_size)
+            if not chunk:
+                break
+            sock.sendall(chunk)
+
+    def close(self):
+        self.file.close()
+
+
+class HttpProxy:
+    """
+    Per-request HTTP/1.1 forwarding for L7 mode
+
+    Each request read from a persistent client connection is sent to the
+    backend the strategy chose for it, over a connection taken from the
+    NetworkProxy's connection pool when one is configured. Backend
+    connections that end cleanly on a message boundary go back to the pool.
+    With `buffer_responses`, response bodies are read into a ResponseSpool
+    so the backend is released before a slow client has read the response.
+    With `buffer_requests`, request bodies are read in full (buffer_request)
+    before a backend is chosen, so slow uploads never hold one.
+    """
+
+    def __init__(self, network_proxy, idle_timeout=5.0, buffer_size=4096,
+                 buffer_responses=False, buffer_memory=1 << 20, buffer_max=64 << 20,
+                 buffer_requests=False, request_buffer_memory=1 << 20, request_buffer_max=16 << 20):
+        self.proxy = network_proxy
+        self.idle_timeout = idle_timeout
+        self.buffer_size = buffer_size
+        self.buffer_responses = buffer_responses
+        self.buffer_memory = buffer_memory
+        self.buffer_max = buffer_max
+        self.buffer_requests = buffer_requests
+        self.request_buffer_memory = request_buffer_memory
+        self.request_buffer_max = request_buffer_max
+
+        self.lock = threading.Lock()
+        self.buffered = 0  # Responses whose backend was released before the client read them
+        self.spilled = 0  # ... of which went past buffer_memory into a temporary file
+        self.overflowed = 0  # Bigger than buffer_max, so streamed instead
+        self.requests_buffered = 0
+        self.requests_spilled = 0
+        self.requests_too_large = 0
+        self.request_buffering_time = 0.0
+
+    def open_backend(self, server_host, server_port, timeout=None):
+        """
+        Connected HttpStream to the backend (pooled when possible), or None.
+        `timeout` (e.g. a request's remaining deadline) can shorten the idle timeout.
+        """
+        server_sock = self.proxy.create_server_connection(server_host, server_port)
+        if not server_sock:
+            return None
+        server_sock.settimeout(self.idle_timeout if timeout is None else min(self.idle_timeout, timeout))
+        # Heads and bodies are written separately; don't let Nagle hold them back
+        server_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return HttpStream(server_sock, self.buffer_size)
+
+    def close_backend(self, server_host, server_port, backend, reusable=False):
+        pool = self.proxy.connection_pool
+        if reusable and pool and not backend.buf:
+            pool.release(server_host, server_port, backend.sock)
+            return
+        try:
+            backend.sock.close()
+        except OSError:
+            pass
+
+    def buffer_request(self, client, request):
+        """
+        Read the body of `request` off `client` ahead of dispatch when request
+        buffering applies. Returns (outcome, body): outcome is None on success
+        (body is a RequestBody, or None if the body stays on the client to be
+        streamed), CLIENT_ABORTED, BAD_REQUEST or BODY_TOO_LARGE. Bodies that declare a
+        Content-Length over the limit are streamed rather than refused.
+        """
+        if not self.buffer_requests or request.framing == FRAMING_NONE:
+            return None, None
+        if request.framing == FRAMING_LENGTH and request.content_length > self.request_buffer_max:
+            return None, None
+
+        started = time.monotonic()
+        body = RequestBody(self.request_buffer_memory, self.request_buffer_max)
+        try:
+            client.forward_body(request, body)
+        except BodyTooLarge:
+            body.close()
+            with self.lock:
+                self.requests_too_large += 1
+            return BODY_TOO_LARGE, None
+        except HttpError:
+            body.close()
+            return BAD_REQUEST, None
+        except (ConnectionClosed, OSError):
+            body.close()
+            return CLIENT_ABORTED, None
+
+        with self.lock:
+            self.requests_buffered += 1
+            self.request_buffering_time += time.monotonic() - started
+            if body.size > self.request_buffer_memory:
+                self.requests_spilled += 1
+        return None, body
+
+    def forward_request(self, client, request, server_host, server_port, timeout=None, timing=None,
+                        on_backend_done=None, body=None):
+        """
+        Send `request` to the backend and relay the response. Its body is the
+        buffered `body` (a RequestBody) if given, else still unread on `client`.
+        Returns (outcome, keep_alive); errors reading the body from the client
+        are the client's (CLIENT_ABORTED, BAD_REQUEST), never the backend's.
+        The phases of the exchange are recorded in `timing` (a RequestTiming), if given. When the response is buffered,
+        on_backend_done() is called as soon as the backend has been released,
+        before the client is sent the body. A backend that answers and closes
+        before it has taken the whole body still has its response relayed;
+        the client connection is closed after it, since its body is unread.
+        """
+        backend = self.open_backend(server_host, server_port, timeout)
+        if backend is None:
+            return CONNECT_FAILED, False
+        if timing is not None:
+            timing.connected = time.monotonic()
+
+        reusable = False
+        sink = _BackendSink(backend.sock)
+        sent = False
+        early = False
+        try:
+            sink.sendall(request.head)
+            if body is not None:
+                body.send_to(sink)
+            else:
+                client.forward_body(request, sink)
+            sent = True
+            if timing is not None:
+                timing.mark_sent()
+
+            response = backend.read_response(request.method)
+            if timing is not None:
+                timing.mark_first_byte()
+        except (HttpError, ConnectionClosed, OSError) as e:
+            if not sent and not sink.failed:
+                # Reading the body from the client failed; the backend did nothing wrong
+                self.close_backend(server_host, server_port, backend)
+                return (BAD_REQUEST if isinstance(e, HttpError) else CLIENT_ABORTED), False
+            response = self._early_response(backend, request) if sink.failed else None
+            if response is None:
+                self.close_backend(server_host, server_port, backend)
+                return NO_RESPONSE, False
+            early = True
+            if timing is not None:
+                timing.mark_first_byte()
+
+        spool = ResponseSpool(client.sock, self.buffer_memory, self.buffer_max) if self.buffer_responses else None
+        try:
+            outcome, keep_alive, reusable = self.relay_response(client, request, backend, response, spool)
+            if early:
+                keep_alive = reusable = False
+            if spool is not None and outcome == RESPONSE_OK:
+                # The backend's part is done: free it before the client has read anything
+                self.close_backend(server_host, server_port, backend, reusable)
+                backend = None
+                if on_backend_done:
+                    on_backend_done()
+                outcome, keep_alive = self._drain_spool(spool, keep_alive)
+            if timing is not None:
+                timing.last_byte = time.monotonic()
+            return outcome, keep_alive
+        finally:
+            if spool is not None:
+                spool.close()
+            if backend is not None:
+                self.close_backend(server_host, server_port, backend, reusable)
+
+    def _early_response(self, backend, request):
+        """
+        The response a backend sent before it stopped taking the request body
+        (e.g. a 413 or 401 followed by a close), or None if it sent nothing usable.
+        """
+        try:
+            return backend.read_response(request.method)
+        except (HttpError, ConnectionClosed, OSError):
+            return None
+
+    def _drain_spool(self, spool, keep_alive):
+        with self.lock:
+            if spool.passthrough:
+                self.overflowed += 1
+            else:
+                self.buffered += 1
+                if spool.peak > self.buffer_memory:
+                    self.spilled += 1
+        try:
+            spool.drain()
+        except OSError:
+            return RESPONSE_ABORTED, False
+        return RESPONSE_OK, keep_alive
+
+    def relay_response(self, client, request, backend, response, body_sink=None):
+        """
+        Forward a response whose head has been read from `backend`. The body
+        goes to `body_sink` (e.g. a ResponseSpool) instead of the client if given.
+        Returns (outcome, client_keep_alive, backend_reusable).
+        """
+        try:
+            while response.status < 200 and response.status != 101:
+                client.sock.sendall(response.head)  # Interim 1xx responses
+                response = backend.read_response(request.method)
+        except (HttpError, ConnectionClosed, OSError):
+            return NO_RESPONSE, False, False
+
+        try:
+            client.sock.sendall(response.head)
+            if response.status == 101:
+                # Protocol upgrade (e.g. WebSocket): the rest is an opaque tunnel
+                self._tunnel(client, backend)
+                return RESPONSE_OK, False, False
+            backend.forward_body(response, body_sink or client.sock)
+        except (HttpError, ConnectionClosed, OSError):
+            return RESPONSE_ABORTED, False, False
+
+        keep_alive = request.keep_alive and response.keep_alive and response.framing != FRAMING_CLOSE
+        return RESPONSE_OK, keep_alive, keep_alive
+
+    def get_stats(self):
+        """Stats of whichever buffering modes are enabled"""
+        stats = {}
+        with self.lock:
+            if self.buffer_responses:
+                stats['response_buffering'] = {
+                    'buffered': self.buffered,
+                    'spilled_to_disk': self.spilled,
+                    'overflowed': self.overflowed,
+                    'memory_limit': self.buffer_memory,
+                    'max_size': self.buffer_max
+                }
+            if self.buffer_requests:
+                stats['request_buffering'] = {
+                    'buffered': self.requests_buffered,
+                    'spilled_to_disk': self.requests_spilled,
+                    'too_large': self.requests_too_large,
+                    'avg_buffering_ms': round(self.request_buffering_time / max(self.requests_buffered, 1) * 1000, 2),
+                    'memory_limit': self.request_buffer_memory,
+                    'max_size': self.request_buffer_max
+                }
+        return stats
+
+    def _tunnel(self, client, backend):
+        if client.buf:
+            backend.sock.sendall(client.buf)
+            client.buf.clear()
+        if backend.buf:
+            client.sock.sendall(backend.buf)
+            backend.buf.clear()
+        self.proxy.forward_data(client.sock, backend.sock)
@@ -1,6 +1,7 @@
 import socket
 import threading
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import time
 from datetime import datetime
 
@@ -9,14 +10,94 @@ from .strategies import (RoundRobinStrategy, LeastConnectionsStrategy,
                         HealthScoreBasedStrategy, HistoricalFailureWeightedRoundRobin,
                         ResponseTimeBasedStrategy, ALPHA1Strategy, BETA1Strategy)
 from .health_monitor import HealthMonitor
-from .proxy import NetworkProxy
+from .proxy import NetworkProxy, ReplayBuffer, RELAYED, RETRYABLE, ABORTED
+from .async_data_plane import AsyncDataPlane
+from .relay_engine import SelectorRelayEngine
+from .workers import WorkerSupervisor
+from .connection_pool import BackendConnectionPool
+from .http_parser import HttpStream, HttpError, ConnectionClosed, FRAMING_NONE, peek_request, request_method
+from .http_proxy import (HttpProxy, RESPONSE_OK, CONNECT_FAILED, NO_RESPONSE,
+                         RESPONSE_ABORTED, CLIENT_ABORTED, BAD_REQUEST, BODY_TOO_LARGE)
+from .request_key import RequestKeyExtractor
+from .hedging import HedgeBudget, HedgedDispatcher
+from .admission import AdmissionController
+from .concurrency_limit import GradientLimit
+from .dispatch_queue import DispatchQueue
+from .priority import PriorityClassifier
+from .retry import RetryBudget, RetryPolicy
+from .timing import RequestTiming
+from .hot_restart import HandoffServer, receive_listener
 
 
 class LoadBalancer:
     def __init__(self, config):
         self.config = config
-        self.pool = ServerPool()
-        self.proxy = NetworkProxy(timeout=config['timeout'])
+        limit_factory = None
+        if config.get('adaptive_concurrency', False):
+            limit_factory = partial(GradientLimit,
+                                    initial=config.get('concurrency_initial_limit', 20),
+                                    max_limit=config.get('concurrency_max_limit', 200))
+        self.pool = ServerPool(limit_factory=limit_factory)
+        # Requests that find every backend at its limit wait here for a freed slot
+        self.dispatch_queue = DispatchQueue(
+            max_depth=config.get('queue_max_depth', 100),
+            timeout=config.get('queue_timeout_ms', 1000) / 1000.0
+        )
+        self.pool.capacity_listener = self.dispatch_queue.notify
+        # 'l4' relays opaque TCP streams; 'l7' parses HTTP/1.1 and routes every request
+        self.mode = config.get('mode', 'l4')
+        self.data_plane = config.get('data_plane', 'threaded')
+        if self.mode == 'l7' and self.data_plane != 'threaded':
+            print(f"L7 mode runs on the threaded data plane (ignoring data_plane={self.data_plane!r})")
+            self.data_plane = 'threaded'
+        relay_engine = None
+        if self.data_plane == 'selectors':
+            relay_engine = SelectorRelayEngine(
+                num_threads=config.get('relay_threads', 4),
+                buffer_size=config.get('buffer_size', 4096),
+                connect_timeout=config['timeout'],
+                response_framing=config.get('response_framing', True),
+                idle_timeout=config.get('relay_idle_timeout', 5.0),
+                first_byte_timeout=config.get('first_byte_timeout'),
+                total_timeout=config.get('relay_total_timeout')
+            )
+        self.connection_pool = None
+        if config.get('connection_pool_size', 0) > 0:
+            self.connection_pool = BackendConnectionPool(
+                self.pool,
+                pool_size=config['connection_pool_size'],
+                max_idle=config.get('pool_max_idle', 30),
+                max_lifetime=config.get('pool_max_lifetime', 300),
+                connect_timeout=config['timeout']
+            )
+        self.proxy = NetworkProxy(timeout=config['timeout'], relay_engine=relay_engine,
+                                  zero_copy=config.get('zero_copy', False),
+                                  connection_pool=self.connection_pool,
+                                  buffer_size=config.get('buffer_size', 4096),
+                                  response_framing=config.get('response_framing', True))
+        self.http_proxy = HttpProxy(self.proxy, buffer_size=config.get('buffer_size', 4096),
+                                    buffer_responses=config.get('response_buffering', False),
+                                    buffer_memory=config.get('response_buffer_memory', 1 << 20),
+                                    buffer_max=config.get('response_buffer_max', 64 << 20),
+                                    buffer_requests=config.get('request_buffering', False),
+                                    request_buffer_memory=config.get('request_buffer_memory', 1 << 20),
+                                    request_buffer_max=config.get('request_buffer_max', 16 << 20))
+        
+        # Hedged dispatch of idempotent requests (L7 mode only)
+        self.hedger = None
+        if config.get('hedging', False):
+            self.hedger = HedgedDispatcher(
+                self.http_proxy, self.pool,
+                HedgeBudget(ratio=config.get('hedge_budget', 0.05)),
+                delay_percentile=config.get('hedge_delay_percentile', 0.95)
+            )
+        # Retries go to untried backends, only when safe, within a budget shared by all requests
+        self.retry_policy = RetryPolicy(
+            max_attempts=config.get('max_retries', 3),
+            budget=RetryBudget(ratio=config.get('retry_budget', 0.2)),
+            backoff_ms=config.get('retry_backoff_ms', 25),
+            backoff_max_ms=config.get('retry_backoff_max_ms', 250)
+        )
         self.monitor = HealthMonitor(self.pool, config)
         
         # Initialize strategy based on config
@@ -36,10 +117,41 @@ class LoadBalancer:
         else:
             self.strategy = RoundRobinStrategy()
         
+        # Compiled once; passes a per-request key to strategies that accept one
+        self.key_extractor = RequestKeyExtractor.from_config(config.get('request_key'))
+        # Optional priority classes for admission, queueing and per-class metrics
+        self.classifier = PriorityClassifier.from_config(config.get('priority_classes'))
+        # L4 connections whose request head must be peeked before dispatch
+        self.peeks_http = ((self.key_extractor is not None and self.key_extractor.needs_http) or
+                           (self.classifier is not None and self.classifier.needs_http))
+        # Remaining latency budget sent by callers; shrunk by time spent here and forwarded in L7
+        self.deadline_header = config.get('deadline_header', 'X-Request-Deadline-Ms')
+        
+        # Enforces max_connections and sheds load before the executor queue grows
+        self.admission = AdmissionController(
+            max_in_flight=config.get('max_connections', 200),
+            max_queue_wait_ms=config.get('max_queue_wait_ms', 500),
+            retry_after=config.get('shed_retry_after', 1),
+            pause_accept=config.get('pause_accept', False)
+        )
+        
         self.running = False
         self.server_sock = None
+        self.supervisor = None  # Set when running in multi-process worker mode
+        # Hot restart: the listener is handed to a successor over this Unix socket
+        self.handoff_path = config.get('hot_restart_socket')
+        self.drain_grace = config.get('drain_grace', 30)
+        self.handoff = None
+        self.draining = False
         self.executor = ThreadPoolExecutor(max_workers=100)
         
+        # Data plane: 'threaded' hands each connection to the executor,
+        # 'asyncio' relays every connection on a single event loop,
+        # 'selectors' multiplexes relays over a few I/O threads
+        self.async_plane = None
+        if self.data_plane == 'asyncio':
+            self.async_plane = AsyncDataPlane(self, buffer_size=config.get('buffer_size', 4096))
+        
         self.stats = {
             'total_requests': 0,
             'active_connections': 0,
@@ -48,7 +160,8 @@ class LoadBalancer:
             'start_time': datetime.now(),
             'recent_requests': [],  # Track recent requests for visualization
             'server_request_counts': {},  # Track requests per server
-            'peak_connections': 0  # Track peak connections
+            'peak_connections': 0,  # Track peak connections
+            'deadline_expired': 0  # Requests dropped because their caller's deadline had passed
         }
         self.stats_lock = threading.Lock()
         self.stats_cache = None
@@ -56,6 +169,8 @@ class LoadBalancer:
     
     def add_backend_server(self, host, port):
         self.pool.add_server(host, port)
+        if self.connection_pool:
+            self.connection_pool.add_backend(host, port)
         print(f"Added backend server {host}:{port}")
     
     def start(self):
@@ -65,20 +180,60 @@ class LoadBalancer:
         self.running = True
         self.monitor.start_monitoring()
         
-        self.server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_sock.bind(('0.0.0.0', self.config['listen_port']))
-        self.server_sock.listen(50)
+        if self.config.get('workers', 1) > 1:
+            self._run_workers()
+            return
+        
+        self.server_sock = receive_listener(self.handoff_path)
+        if self.server_sock:
+            print(f"Took over the listening socket from the previous process ({self.handoff_path})")
+        else:
+            self.server_sock = self._create_listener()
+        if self.handoff_path:
+            self.handoff = HandoffServer(self.handoff_path, self.server_sock, self.begin_drain)
+            self.handoff.start()
+        
+        if self.connection_pool:
+            self.connection_pool.start_maintenance()
         
         print(f"Load balancer listening on port {self.config['listen_port']}")
         print("Press Ctrl+C to stop")
         
+        if self.async_plane:
+            self._serve_async()
+            return
+        
+        if self.proxy.relay_engine:
+            _raise_fd_limit()
+            self.proxy.relay_engine.start()
+        
         try:
-            while self.running:
+            while self.running and not self.draining:
                 try:
+                    if not self.admission.wait_for_capacity():
+                        continue  # At the cap: leave new connections in the kernel backlog
                     self.server_sock.settimeout(1.0)  # Add timeout to make it interruptible
                     client_sock, addr = self.server_sock.accept()
-                    self.executor.submit(self.handle_client, client_sock, addr)
+                    # Only connection-level rules (listener, CIDR) can apply before the request is read
+                    priority = self.classify(client_sock, addr, provisional=True)
+                    if not self.admission.admit(priority.shed_at if priority else 1.0):
+                        if priority:
+                            priority.count_shed()
+                        self.admission.shed(client_sock)
+                        continue
+                    accepted_at = time.monotonic()
+                    if self.proxy.relay_engine:
+                        # The relay's completion releases the admission slot (see _end_relay)
+                        if self.peeks_http:
+                            # Wait for the request head on a worker, then hand off to the engine
+                            self.executor.submit(self._serve_admitted, self.relay_client,
+                                                 client_sock, addr, accepted_at, False)
+                        else:
+                            self.relay_client(client_sock, addr)
+                    elif self.mode == 'l7':
+                        self.executor.submit(self._serve_admitted, self.handle_client_l7, client_sock, addr, accepted_at)
+                    else:
+                        self.executor.submit(self._serve_admitted, self.handle_client, client_sock, addr, accepted_at)
                 except socket.timeout:
                     continue  # Check if still running
                 except socket.error:
@@ -88,112 +243,553 @@ class LoadBalancer:
         except KeyboardInterrupt:
             print("\nReceived interrupt signal...")
         finally:
+            if self.draining:
+                self._wait_for_drain()
+            self.stop()
+    
+    def begin_drain(self):
+        """
+        The listener now belongs to a successor: stop accepting, let in-flight
+        connections finish (up to drain_grace seconds), then stop.
+        """
+        print(f"Listener handed off; draining in-flight connections for up to {self.drain_grace}s")
+        self.draining = True
+        if self.async_plane and self.async_plane.stop_accepting():
+            # The event loop has no accept loop to return to, so drain from here
+            self._wait_for_drain()
             self.stop()
     
+    def _wait_for_drain(self):
+        deadline = time.monotonic() + self.drain_grace
+        while self.admission.in_flight > 0 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if self.admission.in_flight > 0:
+            print(f"Drain grace period over; closing {self.admission.in_flight} connections")
+    
+    def _create_listener(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.config.get('reuse_port'):
+            # Several worker processes bind the same port; the kernel balances accepts
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('0.0.0.0', self.config['listen_port']))
+        # Connections beyond the backlog are refused by the kernel (capped by net.core.somaxconn)
+        sock.listen(self.config.get('listen_backlog', 512))
+        return sock
+    
+    def _run_workers(self):
+        servers = [(srv['host'], srv['port']) for srv in self.pool.get_all_servers()]
+        self.supervisor = WorkerSupervisor(self.config, servers, self.config['workers'],
+                                           pin_cpus=self.config.get('pin_workers', False))
+        self.supervisor.start()
+        print("Press Ctrl+C to stop")
+        try:
+            self.supervisor.supervise()
+        except KeyboardInterrupt:
+            print("\nReceived interrupt signal...")
+        finally:
+            self.stop()
+    
+    def _serve_async(self):
+        _raise_fd_limit()
+        try:
+            self.async_plane.serve(self.server_sock)
+        except KeyboardInterrupt:
+            print("\nReceived interrupt signal...")
+        finally:
+            self.stop()
+    
+    def _serve_admitted(self, handler, client_sock, addr, accepted_at, release=True):
+        """Run a connection handler on a worker, shedding it if it queued too long"""
+        priority = self.classify(client_sock, addr, provisional=True)
+        if not self.admission.dequeued(accepted_at, priority.shed_at if priority else 1.0):
+            if priority:
+                priority.count_shed()
+            self.admission.shed(client_sock)
+            self.admission.release()
+            return
+        try:
+            handler(client_sock, addr)
+        finally:
+            if release:
+                self.admission.release()
+    
     def handle_client(self, client_sock, addr):
         request_start = time.time()
-        
-        with self.stats_lock:
-            self.stats['total_requests'] += 1
-            self.stats['active_connections'] += 1
+        self._begin_request()
         
         success = False
-        selected_server = None
-        max_retries = 3  # Retry with different servers if one fails
+        selected = None
+        priority = None
+        timing = None
         
         try:
             if self.pool.all_servers_down():
                 self.send_error_response(client_sock)
-                with self.stats_lock:
-                    self.stats['failed_requests'] += 1
+                self._count_failure()
                 return
             
+            request, request_key, priority, deadline = self.inspect_client(client_sock, addr)
+            # Request bytes are kept until a backend answers so a retry can resend them
+            replay = ReplayBuffer(self.config.get('replay_buffer', 65536))
+            tried = set()
+            
             # Try multiple servers if needed
-            for attempt in range(max_retries):
-                srv = self.get_next_server()
+            for attempt in range(self.retry_policy.max_attempts):
+                if self._deadline_expired(deadline):
+                    self.send_deadline_response(client_sock)
+                    break
+                srv = self.acquire_server(request_key, deadline, priority, exclude=tried)
                 if not srv:
-                    if attempt == max_retries - 1:
+                    if self._deadline_expired(deadline):
+                        self.send_deadline_response(client_sock)
+                    else:
+                        # No healthy backend, or none freed up before the queue deadline
                         self.send_error_response(client_sock)
-                        with self.stats_lock:
-                            self.stats['failed_requests'] += 1
-                    continue
+                        self._count_failure()
+                    break
                 
-                selected_server = f"{srv['host']}:{srv['port']}"
-                self.pool.increment_connections(srv['host'], srv['port'])
+                selected = srv
+                tried.add((srv.host, srv.port))
+                timing = RequestTiming()
+                ok = False
+                retry = False
+                result = None
                 
                 try:
-                    ok = self.proxy.handle_connection(client_sock, srv['host'], srv['port'])
+                    result = self.proxy.handle_connection(client_sock, srv.host, srv.port, replay, timing)
+                    ok = result == RELAYED
                     if ok:
                         success = True
-                        with self.stats_lock:
-                            self.stats['successful_requests'] += 1
+                        self._count_success()
                         break  # Success, exit retry loop
-                    else:
-                        # Connection failed, mark server as potentially unhealthy
-                        self.pool.mark_unhealthy(srv['host'], srv['port'])
-                        if attempt == max_retries - 1:
-                            self.send_error_response(client_sock)
-                            with self.stats_lock:
-                                self.stats['failed_requests'] += 1
+                    if result == CLIENT_ABORTED:
+                        break  # The client hung up mid-request: nothing to retry, and not the backend's fault
+                    # The backend failed before answering; replay.data holds whatever reached it
+                    self.pool.mark_unhealthy(srv.host, srv.port)
+                    retry = result == RETRYABLE and self.retry_policy.should_retry(
+                        attempt, bool(replay.data), request_method(replay.data))
+                    if not retry:
+                        self.send_error_response(client_sock)
                 except Exception as e:
-                    print(f"Proxy error to {selected_server}: {e}")
-                    self.pool.mark_unhealthy(srv['host'], srv['port'])
-                    if attempt == max_retries - 1:
-                        with self.stats_lock:
-                            self.stats['failed_requests'] += 1
+                    # Part of the response may already be with the client: never retry
+                    print(f"Proxy error to {srv.key}: {e}")
+                    self.pool.mark_unhealthy(srv.host, srv.port)
                 finally:
-                    self.pool.decrement_connections(srv['host'], srv['port'])
+                    # A client abort says nothing about the backend's latency
+                    rtt = None if result == CLIENT_ABORTED else time.monotonic() - timing.dispatched
+                    self.pool.release(srv, rtt, ok)
                 
-                # If we failed, try another server
-                if not success and attempt < max_retries - 1:
-                    time.sleep(0.1)  # Brief delay before retry
+                if not retry:
+                    self._count_failure()
+                    break
+                # The connection owns this worker thread, so the jittered backoff waits on it
+                time.sleep(self.retry_policy.backoff(attempt, deadline))
                 
         finally:
-            request_end = time.time()
-            
-            # Track request for visualization
-            with self.stats_lock:
-                self.stats['active_connections'] -= 1
-                
-                # Track recent requests (keep last 100)
-                request_info = {
-                    'timestamp': request_end,
-                    'server': selected_server,
-                    'success': success,
-                    'duration': request_end - request_start,
-                    'client': f"{addr[0]}:{addr[1]}" if addr else "unknown"
-                }
-                self.stats['recent_requests'].append(request_info)
-                if len(self.stats['recent_requests']) > 100:
-                    self.stats['recent_requests'].pop(0)
-                
-                # Track server request counts
-                if selected_server:
-                    if selected_server not in self.stats['server_request_counts']:
-                        self.stats['server_request_counts'][selected_server] = 0
-                    self.stats['server_request_counts'][selected_server] += 1
-                
-                # Record response time for ResponseTimeBasedStrategy and ALPHA1Strategy
-                if success and selected_server:
-                    host, port = selected_server.split(':')
-                    response_time = request_end - request_start
-                    self.pool.record_response_time(host, int(port), response_time)
-                    
-                    # Also record in strategy if it supports response time tracking
-                    if isinstance(self.strategy, (ResponseTimeBasedStrategy, ALPHA1Strategy)):
-                        self.strategy.record_response_time(host, int(port), response_time)
+            self._finish_request(addr, selected, success, request_start, priority,
+                                 timing if success else None)
             
             try:
                 client_sock.close()
             except:
                 pass
     
-    def get_next_server(self):
-        healthy_servers = self.pool.get_healthy_servers()
+    def handle_client_l7(self, client_sock, addr):
+        """Serve a persistent HTTP/1.1 client; the strategy runs once per request"""
+        client_sock.settimeout(self.config.get('keepalive_timeout', 5))
+        client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = HttpStream(client_sock, self.config.get('buffer_size', 4096))
+        try:
+            while self.running:
+                try:
+                    request = client.read_request()
+                except (HttpError, ConnectionClosed, OSError):
+                    break
+                if request is None:
+                    break  # Client closed between requests
+                if not self.handle_request(client, request, addr):
+                    break
+                if self.draining:
+                    break  # Close between requests so the client reconnects to the successor
+        finally:
+            try:
+                client_sock.close()
+            except:
+                pass
+    
+    def handle_request(self, client, request, addr):
+        """Route one parsed request; returns True if the client connection stays open"""
+        request_start = time.time()
+        self._begin_request()
+        
+        success = False
+        keep_alive = False
+        selected = None
+        outcome = None
+        timing = None
+        
+        request_key = self.key_extractor.extract(request, addr) if self.key_extractor else None
+        priority = self.classify(client.sock, addr, request)
+        deadline = self.request_deadline(request, time.monotonic())
+        expired = False
+        tried = set()
+        body = None
+        
+        try:
+            # With request buffering, slow uploads finish here, before a backend is involved
+            buffer_start = time.monotonic()
+            outcome, body = self.http_proxy.buffer_request(client, request)
+            buffering = time.monotonic() - buffer_start if body is not None else None
+            attempts = self.retry_policy.max_attempts if outcome is None else 0
+            
+            for attempt in range(attempts):
+                expired = self._deadline_expired(deadline)
+                if expired:
+                    break
+                srv = self.acquire_server(request_key, deadline, priority, exclude=tried)
+                if not srv:
+                    expired = self._deadline_expired(deadline)
+                    break
+                
+                host, port = srv.host, srv.port
+                selected = srv
+                tried.add((host, port))
+                timing = RequestTiming(buffering)
+                released = False
+                
+                def release_backend(ok=True, sample=True):
+                    # Once per attempt: early when a buffered response frees the backend
+                    nonlocal released
+                    if not released:
+                        released = True
+                        rtt = time.monotonic() - timing.dispatched if sample else None
+                        self.pool.release(srv, rtt, ok)
+                
+                budget = None
+                if deadline is not None:
+                    # Tell the backend how much of the caller's budget is left
+                    budget = max(deadline - timing.dispatched, 0.001)
+                    request.set_header(self.deadline_header, str(int(budget * 1000)))
+                try:
+                    if self.hedger and self.hedger.eligible(request):
+                        outcome, keep_alive, served_by = self.hedger.forward(
+                            client, request, srv, self.strategy, lambda: self._pick_backup(srv), timing)
+                        selected = served_by
+                        if served_by is not srv:
+                            release_backend(sample=False)  # Cancelled: the primary's latency is unknown
+                    else:
+                        outcome, keep_alive = self.http_proxy.forward_request(client, request, host, port,
+                                                                              budget, timing, release_backend,
+                                                                              body)
+                finally:
+                    # The client's failures say nothing about the backend's latency or health
+                    release_backend(outcome == RESPONSE_OK, outcome not in (CLIENT_ABORTED, BAD_REQUEST))
+                
+                if outcome == RESPONSE_OK:
+                    success = True
+                    self._count_success()
+                    break
+                if outcome in (CONNECT_FAILED, NO_RESPONSE):
+                    self.pool.mark_unhealthy(host, port)
+                # A body consumed from the client cannot be sent again; a buffered one can
+                replayable = outcome == CONNECT_FAILED or (
+                    outcome == NO_RESPONSE and (request.framing == FRAMING_NONE or body is not None))
+                if not replayable or not self.retry_policy.should_retry(attempt, outcome != CONNECT_FAILED, request.method):
+                    break
+                time.sleep(self.retry_policy.backoff(attempt, deadline))
+            
+            if expired:
+                self.send_deadline_response(client.sock)
+                keep_alive = False
+            elif not success:
+                if outcome == BODY_TOO_LARGE:
+                    self.send_too_large_response(client.sock)
+                elif outcome == BAD_REQUEST:
+                    self.send_bad_request_response(client.sock)
+                elif outcome not in (RESPONSE_ABORTED, CLIENT_ABORTED):
+                    self.send_error_response(client.sock)
+                self._count_failure()
+                keep_alive = False
+        finally:
+            if body is not None:
+                body.close()
+            self._finish_request(addr, selected, success, request_start, priority,
+                                 timing if success else None)
+        
+        return keep_alive
+    
+    def _pick_backup(self, primary):
+        """Second server for a hedged request, chosen by the strategy among the others"""
+        candidates = [srv for srv in self.pool.get_available_servers()
+                      if srv is not primary]
+        if not candidates:
+            return None
+        return self.strategy.select_server(candidates)
+    
+    def relay_client(self, client_sock, addr):
+        """Dispatch a client onto the relay engine without tying up a worker thread"""
+        self._begin_request()
+        _, request_key, priority, deadline = self.inspect_client(client_sock, addr)
+        # Request bytes are kept until a backend answers so a retry can resend them
+        replay = ReplayBuffer(self.config.get('replay_buffer', 65536))
+        self._dispatch_relay(client_sock, addr, time.time(), 0, request_key, priority=priority, deadline=deadline,
+                             replay=replay)
+    
+    def _dispatch_relay(self, client_sock, addr, request_start, attempt, request_key=None,
+                        srv=None, priority=None, deadline=None, tried=frozenset(), replay=None):
+        if srv is None:
+            if self._deadline_expired(deadline):
+                self._end_relay(client_sock, addr, None, False, request_start, priority, expired=True)
+                return
+            srv = self._try_acquire_server(request_key, tried)
+            if srv is None and self.pool.get_healthy_servers():
+                # Every backend is at its limit: wait for a slot on a worker, not on the I/O thread
+                self.executor.submit(self._queue_relay, client_sock, addr, request_start,
+                                     attempt, request_key, priority, deadline, tried, replay)
+                return
+        if not srv:
+            self._end_relay(client_sock, addr, None, False, request_start, priority)
+            return
+        
+        host, port = srv.host, srv.port
+        timing = RequestTiming()
+        
+        def on_done(result, timeout=None):
+            ok = result == RELAYED
+            # A timed-out attempt, a client abort or a shutdown says nothing about the backend's latency
+            sample = not timeout and result != CLIENT_ABORTED and result != ABORTED
+            self.pool.release(srv, time.monotonic() - timing.dispatched if sample else None, ok)
+            if ok:
+                self._end_relay(client_sock, addr, srv, True, request_start, priority, timing=timing)
+                return
+            if result == CLIENT_ABORTED:
+                self._end_relay(client_sock, addr, srv, False, request_start, priority, aborted=True)
+                return
+            if result == ABORTED:
+                # The relay engine shut down under the request: a failure, but not the backend's
+                self._end_relay(client_sock, addr, srv, False, request_start, priority, timing=timing)
+                return
+            
+            if timeout == 'deadline':
+                # The caller's deadline ran out, not the backend's patience
+                self._count_expired()
+                self._end_relay(client_sock, addr, srv, False, request_start, priority,
+                                expired=True, timing=timing)
+                return
+            self.pool.mark_unhealthy(host, port)
+            if result != RETRYABLE:
+                self._end_relay(client_sock, addr, srv, False, request_start, priority,
+                                timed_out=timeout is not None, timing=timing)
+                return
+            # The backend failed before answering; replay.data holds whatever reached it
+            if self.retry_policy.should_retry(attempt, bool(replay.data), request_method(replay.data)):
+                # Back off on a worker, not on the I/O thread that ran this callback
+                self.executor.submit(self._retry_relay, client_sock, addr, request_start, attempt + 1,
+                                     request_key, priority, deadline, tried | {(host, port)},
+                                     self.retry_policy.backoff(attempt, deadline), replay)
+            else:
+                self._end_relay(client_sock, addr, srv, False, request_start, priority, timing=timing)
+        
+        self.proxy.submit_connection(client_sock, host, port, on_done, timing, deadline, replay)
+    
+    def _queue_relay(self, client_sock, addr, request_start, attempt, request_key, priority, deadline, tried,
+                     replay):
+        srv = self.acquire_server(request_key, deadline, priority, exclude=tried)
+        if not srv:
+            self._end_relay(client_sock, addr, None, False, request_start, priority,
+                            expired=self._deadline_expired(deadline))
+            return
+        self._dispatch_relay(client_sock, addr, request_start, attempt, request_key, srv, priority, deadline, tried,
+                             replay)
+    
+    def _retry_relay(self, client_sock, addr, request_start, attempt, request_key, priority, deadline, tried, delay,
+                     replay):
+        time.sleep(delay)
+        self._dispatch_relay(client_sock, addr, request_start, attempt, request_key,
+                             priority=priority, deadline=deadline, tried=tried, replay=replay)
+    
+    def _end_relay(self, client_sock, addr, selected, success, request_start, priority=None, expired=False,
+                   timing=None, timed_out=False, aborted=False):
+        if success:
+            self._count_success()
+        elif aborted:
+            pass  # The client hung up mid-request: nobody to answer, and not a failure
+        elif expired or timed_out:
+            # Once the backend has started answering, a status line would corrupt the response
+            if timing is None or timing.first_byte is None:
+                self.send_deadline_response(client_sock)
+            if timed_out:
+                self._count_failure()
+        else:
+            if timing is None or timing.first_byte is None:
+                self.send_error_response(client_sock)
+            self._count_failure()
+        self._finish_request(addr, selected, success, request_start, priority,
+                             timing if success else None)
+        try:
+            client_sock.close()
+        except:
+            pass
+        self.admission.release()
+    
+    def _begin_request(self):
+        self.retry_policy.on_request()
+        with self.stats_lock:
+            self.stats['total_requests'] += 1
+            self.stats['active_connections'] += 1
+    
+    def _count_success(self):
+        with self.stats_lock:
+            self.stats['successful_requests'] += 1
+    
+    def _count_failure(self):
+        with self.stats_lock:
+            self.stats['failed_requests'] += 1
+    
+    def _count_expired(self):
+        with self.stats_lock:
+            self.stats['deadline_expired'] += 1
+    
+    def _finish_request(self, addr, selected, success, request_start, priority=None, timing=None):
+        """
+        Record a finished request in stats and feed latency-aware strategies.
+        `selected` is the Backend that handled it, or None if none did.
+        With the successful attempt's RequestTiming, strategies learn the
+        backend's time to first byte rather than the whole client session.
+        """
+        request_end = time.time()
+        if priority:
+            priority.record(request_end - request_start, success)
+        
+        # Track request for visualization
+        with self.stats_lock:
+            self.stats['active_connections'] -= 1
+            
+            # Track recent requests (keep last 100)
+            request_info = {
+                'timestamp': request_end,
+                'server': selected.key if selected else None,
+                'success': success,
+                'duration': request_end - request_start,
+                'client': f"{addr[0]}:{addr[1]}" if addr else "unknown"
+            }
+            self.stats['recent_requests'].append(request_info)
+            if len(self.stats['recent_requests']) > 100:
+                self.stats['recent_requests'].pop(0)
+            
+            # Track server request counts
+            if selected:
+                counts = self.stats['server_request_counts']
+                counts[selected.key] = counts.get(selected.key, 0) + 1
+            
+            # Record response time for ResponseTimeBasedStrategy and ALPHA1Strategy
+            if success and selected:
+                response_time = request_end - request_start
+                if timing is not None:
+                    self.pool.record_timing(selected, timing)
+                    if timing.ttfb is not None:
+                        response_time = timing.ttfb
+                self.pool.record_response_time(selected, response_time)
+                
+                # Also record in strategy if it supports response time tracking
+                if isinstance(self.strategy, (ResponseTimeBasedStrategy, ALPHA1Strategy)):
+                    self.strategy.record_response_time(selected, response_time)
+    
+    def inspect_client(self, client_sock, addr):
+        """
+        Peeked request (or None), request key, priority class and deadline of
+        an L4 client. The request head is peeked, not consumed, so the relay
+        still forwards every byte; it is only peeked when a key or class needs
+        it, so the deadline header is honoured in L4 only then (and it cannot
+        be rewritten in passthrough).
+        """
+        received_at = time.monotonic()
+        request = None
+        if self.peeks_http:
+            request = peek_request(client_sock, self.config['timeout'])
+        request_key = self.key_extractor.extract(request, addr) if self.key_extractor else None
+        return (request, request_key, self.classify(client_sock, addr, request),
+                self.request_deadline(request, received_at))
+    
+    def request_deadline(self, request, received_at):
+        """Absolute time.monotonic() deadline from the request's deadline header, or None"""
+        if request is None or not self.deadline_header:
+            return None
+        value = request.header(self.deadline_header)
+        if value is None:
+            return None
+        try:
+            budget_ms = float(value)
+        except ValueError:
+            return None
+        return received_at + budget_ms / 1000.0
+    
+    def _deadline_expired(self, deadline):
+        """True (and counted) once a request's deadline has passed"""
+        if deadline is None or time.monotonic() < deadline:
+            return False
+        self._count_expired()
+        return True
+    
+    def classify(self, client_sock, addr, request=None, provisional=False):
+        """Priority class of a connection or request, or None without priority_classes"""
+        if not self.classifier:
+            return None
+        try:
+            port = client_sock.getsockname()[1]
+        except (OSError, AttributeError):
+            port = None
+        return self.classifier.classify(addr, port, request, provisional)
+    
+    def get_next_server(self, request_key=None, exclude=()):
+        # Backends at their adaptive concurrency limit are skipped
+        healthy_servers = self.pool.get_available_servers()
         if not healthy_servers:
             return None
+        if exclude:
+            # A retry avoids the backends its request already tried, unless no other is left
+            untried = [srv for srv in healthy_servers if (srv.host, srv.port) not in exclude]
+            healthy_servers = untried or healthy_servers
+        if request_key is not None and hasattr(self.strategy, 'select_server_with_key'):
+            return self.strategy.select_server_with_key(healthy_servers, request_key)
         return self.strategy.select_server(healthy_servers)
     
+    def acquire_server(self, request_key=None, deadline=None, priority=None, exclude=()):
+        """
+        Choose a backend (other than those in `exclude`, if possible) and take
+        a connection slot on it. While every healthy backend is at its
+        concurrency limit the caller waits in the dispatch queue; returns None
+        if there is no healthy backend or the wait timed out.
+        """
+        if not self.pool.get_healthy_servers():
+            return None
+        return self.dispatch_queue.acquire(lambda: self._try_acquire_server(request_key, exclude), deadline, priority)
+    
+    def _try_acquire_server(self, request_key=None, exclude=()):
+        srv = self.get_next_server(request_key, exclude)
+        if srv and self.pool.try_acquire(srv):
+            return srv
+        return None
+    
+    def send_deadline_response(self, client_sock):
+        try:
+            client_sock.send(b"HTTP/1.1 504 Gateway Timeout\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+    
+    def send_bad_request_response(self, client_sock):
+        try:
+            client_sock.send(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+    
+    def send_too_large_response(self, client_sock):
+        try:
+            client_sock.send(b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+    
     def send_error_response(self, client_sock):
         try:
             response = "HTTP/1.1 503 Service Unavailable\r\n\r\nService Unavailable"
@@ -211,13 +807,26 @@ class LoadBalancer:
         # Stop health monitoring
         self.monitor.stop_monitoring()
         
-        # Close server socket
-        if self.server_sock:
+        if self.handoff:
+            self.handoff.stop()
+        
+        if self.supervisor:
+            self.supervisor.stop()
+        
+        # Close server socket (a running event loop closes its own listener)
+        closed_by_loop = self.async_plane is not None and self.async_plane.stop()
+        if self.server_sock and not closed_by_loop:
             try:
                 self.server_sock.close()
             except:
                 pass
         
+        if self.proxy.relay_engine:
+            self.proxy.relay_engine.stop()
+        
+        if self.connection_pool:
+            self.connection_pool.stop_maintenance()
+        
         # Shutdown executor
         try:
             self.executor.shutdown(wait=True)
@@ -232,6 +841,12 @@ class LoadBalancer:
         if self.stats_cache and (current_time - self.stats_cache_time) < 1.0:
             return self.stats_cache
         
+        if self.supervisor:
+            uptime = (datetime.now() - self.stats['start_time']).total_seconds()
+            self.stats_cache = self.supervisor.get_aggregated_stats(uptime)
+            self.stats_cache_time = current_time
+            return self.stats_cache
+        
         with self.stats_lock:
             uptime = (datetime.now() - self.stats['start_time']).total_seconds()
             
@@ -251,6 +866,7 @@ class LoadBalancer:
                 'total_requests': self.stats['total_requests'],
                 'successful_requests': self.stats['successful_requests'],
                 'failed_requests': self.stats['failed_requests'],
+                'deadline_expired': self.stats['deadline_expired'],
                 'active_connections': self.stats['active_connections'],
                 'peak_connections': self.stats['peak_connections'],
                 'uptime_seconds': round(uptime, 1),
@@ -263,6 +879,22 @@ class LoadBalancer:
                 'recent_requests': list(self.stats['recent_requests'][-10:])  # Last 10 requests
             }
             
+            result['admission'] = self.admission.get_stats()
+            result['dispatch_queue'] = self.dispatch_queue.get_stats()
+            result['retries'] = self.retry_policy.get_stats()
+            if self.classifier:
+                result['priority_classes'] = self.classifier.get_stats()
+            if self.pool.limits:
+                result['concurrency_limits'] = self.pool.get_limit_stats()
+            result['backend_timings'] = self.pool.get_timing_stats()
+            if self.proxy.relay_engine:
+                result['relay_engine'] = self.proxy.relay_engine.get_stats()
+            if self.connection_pool:
+                result['connection_pool'] = self.connection_pool.get_stats()
+            if self.hedger:
+                result['hedging'] = self.hedger.get_stats()
+            result.update(self.http_proxy.get_stats())
+            
             self.stats_cache = result
             self.stats_cache_time = current_time
             return result
@@ -276,4 +908,15 @@ class LoadBalancer:
             'strategy': self.config['strategy'],
             'total_servers': len(servers),
             'healthy_servers': healthy_count
-        }
\ No newline at end of file
+        }
+
+
+def _raise_fd_limit():
+    """Lift the soft open-file limit to the hard limit so one loop can hold many connections"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass  # Not available on this platform
\ No newline at end of file
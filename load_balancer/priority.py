@@ -0,0 +1,135 @@
+import ipaddress
+import threading
+from collections import deque
+
+
+class PriorityClass:
+    """
+    One traffic class. A request belongs to the first class (in config order,
+    highest priority first) with any matching rule; a class without rules
+    catches everything else.
+    """
+
+    def __init__(self, name, rank, weight=1, shed_at=1.0, match=None):
+        self.name = name
+        self.rank = rank  # 0 is the highest priority
+        self.weight = weight
+        self.shed_at = shed_at  # Fraction of admission capacity at which this class starts shedding
+
+        match = match or {}
+        self.ports = set(_as_list(match.get('listener')))
+        self.path_prefixes = tuple(_as_list(match.get('path_prefix')))
+        self.headers = [(h['name'], h.get('value')) for h in _as_list(match.get('header'))]
+        self.networks = [ipaddress.ip_network(cidr, strict=False) for cidr in _as_list(match.get('cidr'))]
+        self.needs_http = bool(self.path_prefixes or self.headers)
+        self.catch_all = not (self.ports or self.needs_http or self.networks)
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.shed = 0
+        self.latencies = deque(maxlen=500)
+
+    def matches(self, addr, port, request):
+        if self.catch_all:
+            return True
+        if port is not None and port in self.ports:
+            return True
+        if addr and self.networks:
+            try:
+                ip = ipaddress.ip_address(addr[0])
+            except ValueError:
+                ip = None
+            if ip is not None and any(ip in net for net in self.networks):
+                return True
+        if request is not None:
+            if self.path_prefixes and request.target.startswith(self.path_prefixes):
+                return True
+            for name, value in self.headers:
+                found = request.header(name)
+                if found is not None and (value is None or found == value):
+                    return True
+        return False
+
+    def record(self, latency, success):
+        with self.lock:
+            self.requests += 1
+            if success:
+                self.latencies.append(latency)
+            else:
+                self.failures += 1
+
+    def count_shed(self):
+        with self.lock:
+            self.shed += 1
+
+    def get_stats(self):
+        with self.lock:
+            ordered = sorted(self.latencies)
+            requests, failures, shed = self.requests, self.failures, self.shed
+        return {
+            'rank': self.rank,
+            'weight': self.weight,
+            'shed_at': self.shed_at,
+            'requests': requests,
+            'failures': failures,
+            'shed': shed,
+            'avg_latency_ms': round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0,
+            'p95_latency_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 2) if ordered else 0
+        }
+
+
+class PriorityClassifier:
+    """
+    Sorts traffic into priority classes from config['priority_classes'], e.g.
+
+        [{'name': 'health', 'weight': 8, 'match': {'path_prefix': '/health'}},
+         {'name': 'interactive', 'weight': 4, 'shed_at': 0.9},
+         {'name': 'batch', 'weight': 1, 'shed_at': 0.6,
+          'match': {'cidr': '10.8.0.0/16', 'header': {'name': 'X-Batch'}}}]
+
+    Rules: 'listener' (local port), 'path_prefix', 'header' ({'name', 'value'},
+    value optional) and 'cidr'; each takes one value or a list. Admission
+    sheds a class once in-flight connections pass shed_at of max_connections,
+    so lower classes go first, and the dispatch queue serves waiting classes
+    in proportion to their weights.
+    """
+
+    def __init__(self, classes):
+        self.classes = [PriorityClass(rank=rank, **spec) for rank, spec in enumerate(classes)]
+        self.default = next((c for c in self.classes if c.catch_all), None)
+        if self.default is None:
+            self.default = PriorityClass('default', rank=len(self.classes))
+            self.classes.append(self.default)
+        self.needs_http = any(c.needs_http for c in self.classes)
+
+    @classmethod
+    def from_config(cls, spec):
+        if not spec:
+            return None
+        return cls(spec)
+
+    def classify(self, addr=None, port=None, request=None, provisional=False):
+        """
+        The request's class. With provisional=True (before the request head is
+        read) returns None while a rule on the head could still decide it.
+        """
+        for priority in self.classes:
+            if priority.catch_all:
+                continue
+            if priority.matches(addr, port, request):
+                return priority
+            if provisional and priority.needs_http:
+                return None
+        return self.default
+
+    def get_stats(self):
+        return {c.name: c.get_stats() for c in self.classes}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
@@ -1,11 +1,144 @@
+import errno
+import os
 import socket
 import select
+import threading
+import time
+
+from .http_parser import ExchangeTracker
+from .http_proxy import CLIENT_ABORTED  # Also a result here: the client closed before sending a whole request
+
+# Zero-copy relay moves bytes socket -> pipe -> socket inside the kernel (Linux, Python 3.10+)
+SPLICE_AVAILABLE = hasattr(os, 'splice')
+SPLICE_CHUNK = 65536
+SPLICE_FLAGS = (os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK) if SPLICE_AVAILABLE else 0
+
+# Results of NetworkProxy.handle_connection
+RELAYED = 'relayed'            # The backend answered and the connection was relayed
+RETRYABLE = 'retryable'        # Backend unreachable, or failed before answering with the request replayable
+NOT_REPLAYABLE = 'not_replayable'  # Backend failed before answering, but the request outgrew the replay buffer
+ABORTED = 'aborted'            # The relay engine shut down with the connection in flight (not the backend's fault)
+
+
+class _SpliceUnsupported(Exception):
+    """Raised before any byte moved when the sockets cannot be spliced"""
+
+
+class ReplayBuffer:
+    """
+    Copy of the request bytes a client has sent, kept until the backend
+    answers so a retry can resend them to another backend. Once more than
+    `limit` bytes have gone by the request can no longer be replayed.
+    """
+
+    __slots__ = ('data', 'limit', 'client_eof', 'overflowed')
+
+    def __init__(self, limit=65536):
+        self.data = bytearray()
+        self.limit = limit
+        self.client_eof = False
+        self.overflowed = False
+
+    def record(self, chunk):
+        if self.overflowed:
+            return
+        if len(self.data) + len(chunk) > self.limit:
+            self.overflowed = True
+            self.data.clear()
+        else:
+            self.data += chunk
+
+    @property
+    def replayable(self):
+        return not self.overflowed
+
+
+def client_aborted(replay, exchange=None):
+    """
+    True when a backend that closed without answering was only following
+    the client: the client closed its side before sending a complete
+    request. Without an ExchangeTracker any client close counts.
+    """
+    if not replay.client_eof:
+        return False
+    if exchange is None:
+        return True
+    requests = exchange.requests
+    return not requests.completed or not requests.idle
+
+
+def unanswered_result(replay, exchange=None):
+    """Result of an attempt whose backend closed or failed before answering"""
+    if client_aborted(replay, exchange):
+        return CLIENT_ABORTED
+    return RETRYABLE if replay.replayable else NOT_REPLAYABLE
+
+
+class BufferPool:
+    """
+    Free list of preallocated receive buffers. Relays fill them with
+    recv_into and send from memoryview slices, so the copy loop allocates
+    nothing per read.
+    """
+
+    def __init__(self, buffer_size=4096, max_free=256):
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self.free = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+        return bytearray(self.buffer_size)
+
+    def release(self, buf):
+        with self.lock:
+            if len(self.free) < self.max_free:
+                self.free.append(buf)
+
+
+class _Direction:
+    """One half of a copy-loop relay: bytes read from src and not yet written to dst"""
+
+    __slots__ = ('src', 'dst', 'buf', 'view', 'pending', 'eof', 'track')
+
+    def __init__(self, src, dst, buf, track=None):
+        self.src = src
+        self.dst = dst
+        self.buf = buf
+        self.view = memoryview(buf)
+        self.pending = None  # memoryview slice still owed to dst
+        self.eof = False
+        self.track = track  # Optional ExchangeTracker feed for the bytes read
+
+    def flush(self):
+        sent = self.dst.send(self.pending)
+        self.pending = self.pending[sent:] if sent < len(self.pending) else None
+        if self.pending is None and self.eof:
+            _shutdown_write(self.dst)
+
 
 class NetworkProxy:
-    def __init__(self, timeout=5):
+    def __init__(self, timeout=5, relay_engine=None, zero_copy=False, connection_pool=None, buffer_size=4096,
+                 response_framing=True):
         self.timeout = timeout
+        self.buffer_size = buffer_size
+        self.buffers = BufferPool(buffer_size)
+        self.relay_engine = relay_engine  # Optional SelectorRelayEngine for event-driven relays
+        self.zero_copy = zero_copy and SPLICE_AVAILABLE
+        self.connection_pool = connection_pool  # Optional BackendConnectionPool of pre-warmed sockets
+        # End HTTP/1.x relays once the response is complete instead of waiting for a close
+        self.response_framing = response_framing
     
     def create_server_connection(self, server_host, server_port):
+        if self.connection_pool:
+            sock = self.connection_pool.acquire(server_host, server_port)
+            if sock:
+                sock.settimeout(self.timeout)
+            return sock
+        
         try:
             srv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             srv_sock.settimeout(self.timeout)
@@ -14,53 +147,131 @@ class NetworkProxy:
         except:
             return None
     
-    def forward_data(self, client_sock, server_sock):
+    def forward_data(self, client_sock, server_sock, exchange=None):
+        """
+        Copy loop with flow control. Each direction holds at most one buffer
+        of unsent data; while it is pending the proxy waits for the receiver
+        to become writable and stops reading from the sender, so a slow
+        reader costs neither memory nor CPU. Half-closes are forwarded.
+        With an ExchangeTracker the relay also ends as soon as every response
+        has been delivered in full; returns True when it ended that way.
+        """
+        directions = (
+            _Direction(client_sock, server_sock, self.buffers.acquire(), exchange and exchange.from_client),
+            _Direction(server_sock, client_sock, self.buffers.acquire(), exchange and exchange.from_server),
+        )
         try:
-            # Set non-blocking mode for better handling
             client_sock.setblocking(False)
             server_sock.setblocking(False)
             
-            sockets = [client_sock, server_sock]
-            client_done = False
-            server_done = False
-            
-            while not (client_done and server_done):
-                # Use longer timeout to avoid premature disconnection
-                ready, _, exceptional = select.select(sockets, [], sockets, 5.0)
+            while True:
+                readers = [d.src for d in directions if not d.eof and d.pending is None]
+                writers = [d.dst for d in directions if d.pending is not None]
+                if not readers and not writers:
+                    break  # Both sides closed and everything was delivered
                 
-                # Check for exceptional conditions
-                if exceptional:
-                    break
+                readable, writable, exceptional = select.select(readers, writers, readers + writers, 5.0)
+                if exceptional or not (readable or writable):
+                    break  # Error or idle timeout
                 
-                # If no sockets ready after timeout, check if both sides are done
-                if not ready:
+                for d in directions:
+                    try:
+                        if d.pending is not None and d.dst in writable:
+                            d.flush()
+                        if d.pending is None and not d.eof and d.src in readable:
+                            n = d.src.recv_into(d.buf)
+                            if not n:
+                                d.eof = True
+                                _shutdown_write(d.dst)
+                                continue
+                            if d.track:
+                                d.track(d.buf, n)
+                            d.pending = d.view[:n]
+                            d.flush()  # Usually completes without another select round
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    except OSError:
+                        return False
+                
+                if exchange is not None and exchange.complete and not any(d.pending for d in directions):
+                    return True  # Last response byte delivered; don't wait for anyone to close
+        except Exception:
+            pass
+        finally:
+            for d in directions:
+                d.pending = None
+                d.view.release()
+                self.buffers.release(d.buf)
+            # Restore blocking mode
+            try:
+                client_sock.setblocking(True)
+            except:
+                pass
+            try:
+                server_sock.setblocking(True)
+            except:
+                pass
+    
+    def relay(self, client_sock, server_sock):
+        """Relay both directions, preferring the zero-copy splice path when enabled"""
+        if self.zero_copy:
+            try:
+                self.splice_forward(client_sock, server_sock)
+                return
+            except _SpliceUnsupported:
+                pass  # Fall back to the copy loop
+        self.forward_data(client_sock, server_sock)
+    
+    def splice_forward(self, client_sock, server_sock):
+        """
+        L4 passthrough with os.splice: each direction moves through its own
+        kernel pipe, so payload bytes never become Python objects.
+        """
+        try:
+            pipes = {client_sock: os.pipe(), server_sock: os.pipe()}
+        except OSError:
+            raise _SpliceUnsupported()
+        
+        peers = {client_sock: server_sock, server_sock: client_sock}
+        readers = [client_sock, server_sock]
+        moved = False
+        
+        try:
+            client_sock.setblocking(False)
+            server_sock.setblocking(False)
+            
+            while readers:
+                ready, _, exceptional = select.select(readers, [], readers, 5.0)
+                if exceptional or not ready:
                     break
                 
                 for sock in ready:
+                    pipe_r, pipe_w = pipes[sock]
                     try:
-                        data = sock.recv(4096)
-                        if not data:
-                            # Connection closed
-                            if sock is client_sock:
-                                client_done = True
-                            else:
-                                server_done = True
-                            continue
-                            
-                        if sock is client_sock:
-                            server_sock.sendall(data)
-                        else:
-                            client_sock.sendall(data)
-                    except socket.error as e:
-                        # Handle would-block errors gracefully
-                        if e.errno not in (socket.EAGAIN, socket.EWOULDBLOCK):
-                            return
-                    except Exception:
+                        n = os.splice(sock.fileno(), pipe_w, SPLICE_CHUNK, flags=SPLICE_FLAGS)
+                    except BlockingIOError:
+                        continue
+                    except OSError as e:
+                        if not moved and e.errno in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                            raise _SpliceUnsupported()
+                        return
+                    
+                    if n == 0:
+                        # Forward the half-close and stop watching this side
+                        readers.remove(sock)
+                        try:
+                            peers[sock].shutdown(socket.SHUT_WR)
+                        except OSError:
+                            pass
+                        continue
+                    
+                    moved = True
+                    if not self._drain_pipe(pipe_r, peers[sock], n):
                         return
-        except Exception:
-            pass
         finally:
-            # Restore blocking mode
+            for pipe_r, pipe_w in pipes.values():
+                os.close(pipe_r)
+                os.close(pipe_w)
             try:
                 client_sock.setblocking(True)
             except:
@@ -70,16 +281,118 @@ class NetworkProxy:
             except:
                 pass
     
-    def handle_connection(self, client_sock, server_host, server_port):
+    def _drain_pipe(self, pipe_r, dst_sock, pending):
+        """Move `pending` bytes from a pipe into a non-blocking socket"""
+        while pending > 0:
+            try:
+                pending -= os.splice(pipe_r, dst_sock.fileno(), pending, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                _, writable, _ = select.select([], [dst_sock], [], self.timeout)
+                if not writable:
+                    return False
+            except OSError:
+                return False
+        return True
+    
+    def await_first_response(self, client_sock, server_sock, replay, exchange=None, timing=None):
+        """
+        Send the request to the backend, recording it in `replay`, until the
+        backend sends its first byte. Bytes from an earlier attempt are
+        resent first. Returns False if the backend failed before answering.
+        Everything sent is also fed to `exchange`, and sends and the first
+        response byte are timestamped in `timing`, if given.
+        """
+        try:
+            if replay.data:
+                server_sock.sendall(replay.data)
+                if exchange is not None:
+                    exchange.from_client(replay.data)
+                if timing is not None:
+                    timing.mark_sent()
+            if replay.client_eof:
+                server_sock.shutdown(socket.SHUT_WR)
+            
+            while True:
+                readers = [server_sock] if replay.client_eof else [client_sock, server_sock]
+                ready, _, _ = select.select(readers, [], [], self.timeout)
+                if not ready:
+                    return True  # Idle; the relay applies its own timeout from here
+                
+                if server_sock in ready:
+                    # Readable with nothing to read means the backend closed or reset
+                    if not server_sock.recv(1, socket.MSG_PEEK):
+                        return False
+                    if timing is not None:
+                        timing.mark_first_byte()
+                    return True
+                
+                data = client_sock.recv(self.buffer_size)
+                if not data:
+                    replay.client_eof = True
+                    server_sock.shutdown(socket.SHUT_WR)
+                    continue
+                replay.record(data)
+                server_sock.sendall(data)
+                if exchange is not None:
+                    exchange.from_client(data)
+                if timing is not None:
+                    timing.mark_sent()
+        except OSError:
+            return False
+    
+    def handle_connection(self, client_sock, server_host, server_port, replay=None, timing=None):
+        """
+        Relay one client connection through the given backend. Returns
+        RETRYABLE when the backend could not be used and the request can go
+        elsewhere: it was unreachable, or, with a `replay` buffer, it failed
+        before sending its first byte while the request could still be
+        replayed. NOT_REPLAYABLE is the same failure after the request
+        outgrew the buffer, and CLIENT_ABORTED one the client caused by
+        closing mid-request; RELAYED means the backend answered. The phases
+        of the attempt are recorded in `timing` (a RequestTiming).
+        """
         server_sock = self.create_server_connection(server_host, server_port)
         if not server_sock:
-            return False
+            return RETRYABLE
+        if timing is not None:
+            timing.connected = time.monotonic()
         
         try:
-            self.forward_data(client_sock, server_sock)
-            return True
+            exchange = ExchangeTracker() if self.response_framing and replay is not None else None
+            if replay is not None and not self.await_first_response(client_sock, server_sock, replay, exchange, timing):
+                return unanswered_result(replay, exchange)
+            if exchange is not None and (not exchange.requests.started or exchange.opaque):
+                exchange = None  # Not HTTP/1.x: keep the zero-copy path
+            if exchange is None:
+                self.relay(client_sock, server_sock)
+            elif (self.forward_data(client_sock, server_sock, exchange) and exchange.reusable
+                    and self.connection_pool):
+                # The backend kept its connection open after a complete response: pool it
+                self.connection_pool.release(server_host, server_port, server_sock)
+                server_sock = None
+            if timing is not None:
+                timing.last_byte = time.monotonic()
+            return RELAYED
         finally:
-            try:
-                server_sock.close()
-            except:
-                pass
\ No newline at end of file
+            if server_sock is not None:
+                try:
+                    server_sock.close()
+                except:
+                    pass
+    
+    def submit_connection(self, client_sock, server_host, server_port, on_done, timing=None, deadline=None,
+                          replay=None):
+        """Relay on the event-driven engine; on_done(result, timeout) runs when the relay ends"""
+        server_sock = None
+        if self.connection_pool:
+            # Only take an already-open connection; the engine connects without blocking
+            server_sock = self.connection_pool.acquire(server_host, server_port, connect=False)
+        self.relay_engine.submit(client_sock, server_host, server_port, on_done, server_sock=server_sock,
+                                 timing=timing, deadline=deadline, replay=replay)
+
+
+def _shutdown_write(sock):
+    try:
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
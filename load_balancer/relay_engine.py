@@ -0,0 +1,500 @@
+import errno
+import itertools
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from .http_parser import ExchangeTracker
+from .proxy import ReplayBuffer, unanswered_result, RELAYED, RETRYABLE, NOT_REPLAYABLE, CLIENT_ABORTED, ABORTED
+from .timer_wheel import TimerWheel
+
+# Timeout phases counted by the engine
+TIMEOUT_PHASES = ('connect', 'first_byte', 'idle', 'total', 'deadline')
+
+
+class _Relay:
+    """Per-connection state for one client/backend socket pair"""
+
+    __slots__ = ('client', 'server', 'on_done', 'connected', 'started',
+                 'last_activity', 'to_server', 'to_client', 'client_eof',
+                 'server_eof', 'client_events', 'server_events', 'exchange', 'timing',
+                 'deadline', 'responded', 'timers', 'address', 'replay', 'pooled', 'resent')
+
+    def __init__(self, client, server, on_done, exchange=None, timing=None, deadline=None, address=None,
+                 replay=None):
+        self.client = client
+        self.server = server
+        self.on_done = on_done
+        self.address = address  # (host, port) of the backend
+        self.connected = False
+        self.started = time.monotonic()
+        self.last_activity = self.started
+        self.to_server = bytearray()  # Bytes read from the client, not yet sent to the backend
+        self.to_client = bytearray()  # Bytes read from the backend, not yet sent to the client
+        self.client_eof = False
+        self.server_eof = False
+        self.client_events = 0
+        self.server_events = 0
+        self.exchange = exchange  # ExchangeTracker while the stream still looks like HTTP/1.x
+        self.timing = timing  # Optional RequestTiming filled in as the relay progresses
+        self.deadline = deadline  # time.monotonic() by which the caller gives up, if any
+        self.responded = False  # Backend has sent its first byte
+        self.timers = {}  # Pending TimerWheel timers by phase
+        # Request bytes read from the client until the backend answers, kept across attempts
+        self.replay = replay if replay is not None else ReplayBuffer()
+        self.pooled = False  # The backend connection came from the connection pool
+        self.resent = False  # The request went out again on a fresh connection
+
+
+class _RelayLoop:
+    """
+    One I/O thread multiplexing many relays on a selector (epoll on Linux)
+
+    Timeouts live on a TimerWheel driven by the loop. Each relay arms at most
+    one timer per phase: connect (until the backend accepts), first_byte
+    (from the first request bytes sent to the first response byte), idle
+    (re-armed lazily from last_activity when it fires) and total (the
+    earlier of total_timeout and the request's deadline).
+
+    Until the backend answers, the relay records what the client sent in
+    its ReplayBuffer. A pooled connection the backend closes before
+    answering (it was closed just as it was handed out) is replaced by a
+    fresh one and the request sent again. Any other backend that fails
+    before answering ends the relay as RETRYABLE while the buffer still
+    holds the whole request, so the caller can resend it elsewhere, as
+    NOT_REPLAYABLE once it does not, or as CLIENT_ABORTED when the client
+    had closed before sending a complete request.
+
+    When the loop stops, relays still in flight and relays submitted but
+    not yet begun (including any submitted after it stopped) end as ABORTED.
+    """
+
+    def __init__(self, name, buffer_size, max_buffer, idle_timeout, connect_timeout,
+                 first_byte_timeout=None, total_timeout=None):
+        self.name = name
+        self.buffer_size = buffer_size
+        self.max_buffer = max_buffer
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.first_byte_timeout = first_byte_timeout
+        self.total_timeout = total_timeout
+
+        self.selector = selectors.DefaultSelector()
+        self.timers = TimerWheel()
+        self.timeouts = dict.fromkeys(TIMEOUT_PHASES, 0)
+        self.stale_reconnects = 0
+        self.pending = deque()
+        self.relays = set()
+        self.running = False
+        self.stopped = False
+        self.thread = None
+
+        # Self-pipe so submit() can wake the loop from other threads
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    def start(self):
+        self.running = True
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wake()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=2)
+
+    def submit(self, relay):
+        self.pending.append(relay)
+        if self.stopped:
+            self._abort_pending()  # The loop has exited and won't pick it up
+        else:
+            self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Wake-up already pending
+
+    def _run(self):
+        while self.running:
+            wait = self.timers.time_to_next()
+            for key, mask in self.selector.select(timeout=1.0 if wait is None else min(wait, 1.0)):
+                if key.data is None:
+                    self._drain_wakeups()
+                    continue
+                relay, is_client = key.data
+                # A socket replaced earlier in this batch (see _reconnect) may still report events
+                if relay in self.relays and key.fileobj is (relay.client if is_client else relay.server):
+                    self._on_event(relay, is_client, mask)
+
+            while self.pending:
+                self._begin(self.pending.popleft())
+
+            self.timers.advance()
+
+        for relay in list(self.relays):
+            self._finish(relay, ABORTED)
+        self.stopped = True
+        self._abort_pending()
+
+    def _abort_pending(self):
+        """End relays that were submitted but never begun (safe from any thread once stopped)"""
+        while True:
+            try:
+                relay = self.pending.popleft()
+            except IndexError:
+                return
+            self._finish(relay, ABORTED)
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _begin(self, relay):
+        """Start relaying, or wait for the non-blocking connect to the backend"""
+        self.relays.add(relay)
+        replay = relay.replay
+        if replay.data:
+            # Sent to an earlier backend that failed before answering: send it again first
+            relay.to_server += replay.data
+            if relay.exchange is not None:
+                relay.exchange.from_client(replay.data)
+        relay.client_eof = replay.client_eof
+        total, phase = self.total_timeout, 'total'
+        if relay.deadline is not None:
+            remaining = relay.deadline - time.monotonic()
+            if total is None or remaining < total:
+                total, phase = remaining, 'deadline'
+        if total is not None:
+            self._arm(relay, phase, total)
+        if relay.connected:
+            self._arm(relay, 'idle', self.idle_timeout)
+            relay.client.setblocking(False)
+            self._update_interest(relay)
+        else:
+            self._arm(relay, 'connect', self.connect_timeout)
+            self._set_events(relay, False, selectors.EVENT_WRITE)
+
+    def _arm(self, relay, phase, delay):
+        relay.timers[phase] = self.timers.schedule(max(delay, 0.0), lambda: self._on_timeout(relay, phase))
+
+    def _disarm(self, relay, phase):
+        self.timers.cancel(relay.timers.pop(phase, None))
+
+    def _on_timeout(self, relay, phase):
+        relay.timers.pop(phase, None)
+        if relay not in self.relays:
+            return
+        if phase == 'idle':
+            # Activity since arming pushes the timeout back instead of re-arming on every read
+            idle_for = time.monotonic() - relay.last_activity
+            if idle_for < self.idle_timeout:
+                self._arm(relay, 'idle', self.idle_timeout - idle_for)
+                return
+        self.timeouts[phase] += 1
+        if phase == 'connect':
+            # A backend that never accepted can be skipped as long as the request can be sent again
+            self._finish(relay, unanswered_result(relay.replay, relay.exchange), phase)
+        elif phase == 'idle' and relay.responded and relay.exchange is None:
+            self._finish(relay, RELAYED)  # A stream with no message framing ends by going quiet
+        else:
+            self._finish(relay, NOT_REPLAYABLE, phase)
+
+    def _on_event(self, relay, is_client, mask):
+        if not relay.connected:
+            if not is_client:
+                self._on_connect(relay)
+            return
+
+        try:
+            if mask & selectors.EVENT_READ:
+                self._on_readable(relay, is_client)
+            if relay in self.relays and relay.connected and mask & selectors.EVENT_WRITE:
+                self._on_writable(relay, is_client)
+        except OSError:
+            if is_client:
+                # After the backend has answered, a client reset is just how many streams end
+                self._finish(relay, RELAYED if relay.responded else CLIENT_ABORTED)
+            elif not relay.responded:
+                self._unanswered_close(relay)
+            else:
+                self._finish(relay, NOT_REPLAYABLE)  # Reset mid-response
+            return
+
+        if relay in self.relays and relay.connected:
+            self._update_interest(relay)
+
+    def _on_connect(self, relay):
+        err = relay.server.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err != 0:
+            self._finish(relay, unanswered_result(relay.replay, relay.exchange))
+            return
+        relay.connected = True
+        relay.last_activity = time.monotonic()
+        if relay.timing is not None:
+            relay.timing.connected = relay.last_activity
+        self._disarm(relay, 'connect')
+        self._arm(relay, 'idle', self.idle_timeout)
+        relay.client.setblocking(False)
+        self._update_interest(relay)
+
+    def _on_readable(self, relay, is_client):
+        sock = relay.client if is_client else relay.server
+        try:
+            data = sock.recv(self.buffer_size)
+        except (BlockingIOError, InterruptedError):
+            return
+
+        relay.last_activity = time.monotonic()
+        if not data:
+            if is_client:
+                relay.client_eof = True
+                relay.replay.client_eof = True
+            elif not relay.responded:
+                self._unanswered_close(relay)
+                return
+            else:
+                relay.server_eof = True
+            self._propagate_eof(relay)
+            return
+
+        if is_client:
+            relay.to_server += data
+            if not relay.responded:
+                relay.replay.record(data)
+        else:
+            relay.to_client += data
+            if not relay.responded:
+                relay.responded = True
+                self._disarm(relay, 'first_byte')
+            if relay.timing is not None:
+                relay.timing.mark_first_byte()
+        if relay.exchange is not None:
+            if is_client:
+                relay.exchange.from_client(data)
+            else:
+                relay.exchange.from_server(data)
+            if relay.exchange.opaque:
+                relay.exchange = None
+
+    def _on_writable(self, relay, is_client):
+        sock = relay.client if is_client else relay.server
+        buf = relay.to_client if is_client else relay.to_server
+        if not buf:
+            return
+        try:
+            sent = sock.send(buf)
+        except (BlockingIOError, InterruptedError):
+            return
+        del buf[:sent]
+        relay.last_activity = time.monotonic()
+        if not is_client:
+            if relay.timing is not None:
+                relay.timing.mark_sent()
+            if (self.first_byte_timeout is not None and not relay.responded
+                    and 'first_byte' not in relay.timers):
+                self._arm(relay, 'first_byte', self.first_byte_timeout)
+        if (relay.exchange is not None and not relay.to_client and not relay.to_server
+                and relay.exchange.complete):
+            self._finish(relay, RELAYED)  # Last response byte delivered; don't wait for a close
+            return
+        self._propagate_eof(relay)
+
+    def _unanswered_close(self, relay):
+        """The backend closed or reset the connection before its first byte"""
+        if relay.pooled and not relay.resent and relay.replay.replayable:
+            self._reconnect(relay)  # Most likely closed while idle in the pool
+        else:
+            self._finish(relay, unanswered_result(relay.replay, relay.exchange))
+
+    def _reconnect(self, relay):
+        """The pooled connection closed before answering: resend the request on a fresh one"""
+        self.stale_reconnects += 1
+        self._set_events(relay, True, 0)
+        self._set_events(relay, False, 0)
+        self._disarm(relay, 'idle')
+        self._disarm(relay, 'first_byte')
+        try:
+            relay.server.close()
+        except OSError:
+            pass
+        relay.to_server[:] = relay.replay.data  # Everything read from the client so far
+        relay.resent = True
+        relay.server_eof = False
+        relay.connected = False
+        try:
+            relay.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            relay.server.setblocking(False)
+            err = relay.server.connect_ex(relay.address)
+        except OSError:
+            err = errno.ECONNREFUSED
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._finish(relay, unanswered_result(relay.replay, relay.exchange))
+            return
+        self._arm(relay, 'connect', self.connect_timeout)
+        self._set_events(relay, False, selectors.EVENT_WRITE)
+
+    def _propagate_eof(self, relay):
+        """Forward a half-close once everything read before it has been delivered"""
+        if relay.client_eof and not relay.to_server:
+            _shutdown_write(relay.server)
+        if relay.server_eof and not relay.to_client:
+            _shutdown_write(relay.client)
+        if relay.client_eof and relay.server_eof and not relay.to_server and not relay.to_client:
+            self._finish(relay, RELAYED)
+
+    def _update_interest(self, relay):
+        client_events = 0
+        server_events = 0
+        # Only read from a side while the opposite buffer has room
+        if not relay.client_eof and len(relay.to_server) < self.max_buffer:
+            client_events |= selectors.EVENT_READ
+        if not relay.server_eof and len(relay.to_client) < self.max_buffer:
+            server_events |= selectors.EVENT_READ
+        if relay.to_client:
+            client_events |= selectors.EVENT_WRITE
+        if relay.to_server:
+            server_events |= selectors.EVENT_WRITE
+        self._set_events(relay, True, client_events)
+        self._set_events(relay, False, server_events)
+
+    def _set_events(self, relay, is_client, events):
+        sock = relay.client if is_client else relay.server
+        current = relay.client_events if is_client else relay.server_events
+        if events == current:
+            return
+        if current == 0:
+            self.selector.register(sock, events, (relay, is_client))
+        elif events == 0:
+            self.selector.unregister(sock)
+        else:
+            self.selector.modify(sock, events, (relay, is_client))
+        if is_client:
+            relay.client_events = events
+        else:
+            relay.server_events = events
+
+    def _finish(self, relay, result, timeout=None):
+        self.relays.discard(relay)
+        for timer in relay.timers.values():
+            self.timers.cancel(timer)
+        relay.timers.clear()
+        if relay.timing is not None:
+            relay.timing.last_byte = time.monotonic()
+        self._set_events(relay, True, 0)
+        self._set_events(relay, False, 0)
+        try:
+            relay.server.close()
+        except OSError:
+            pass
+        try:
+            relay.client.setblocking(True)
+        except OSError:
+            pass
+        try:
+            relay.on_done(result, timeout)
+        except Exception as e:
+            print(f"Relay completion error: {e}")
+
+
+class SelectorRelayEngine:
+    """
+    Event-driven relay engine for NetworkProxy
+
+    A small fixed number of I/O threads each multiplex thousands of
+    client/backend socket pairs with selectors.DefaultSelector, so a relayed
+    connection costs a compact _Relay record instead of a thread. Backend
+    connects are non-blocking too; on_done(result, timeout) is called from
+    the I/O thread with one of NetworkProxy's results and `timeout` naming
+    the phase that expired, if any. RETRYABLE means the backend failed
+    before answering while the `replay` buffer passed to submit() still
+    holds the whole request, so callers can resend it elsewhere by
+    submitting again with the same buffer. Pooled connections the backend
+    closes before answering are replaced transparently (see _RelayLoop). With `response_framing`, HTTP/1.x relays end as soon as
+    every response has been delivered. Timeouts per phase are counted in
+    get_stats(); first_byte_timeout and total_timeout are off when None.
+    """
+
+    def __init__(self, num_threads=4, buffer_size=4096, max_buffer=65536, idle_timeout=5.0, connect_timeout=3,
+                 response_framing=True, first_byte_timeout=None, total_timeout=None):
+        self.loops = [
+            _RelayLoop(f"relay-{i}", buffer_size, max_buffer, idle_timeout, connect_timeout,
+                       first_byte_timeout, total_timeout)
+            for i in range(max(1, num_threads))
+        ]
+        self.response_framing = response_framing
+        self._next_loop = itertools.cycle(self.loops)
+        self._lock = threading.Lock()
+
+    def start(self):
+        for loop in self.loops:
+            loop.start()
+
+    def stop(self):
+        for loop in self.loops:
+            loop.stop()
+
+    def submit(self, client_sock, server_host, server_port, on_done, server_sock=None, timing=None, deadline=None,
+               replay=None):
+        exchange = ExchangeTracker() if self.response_framing else None
+        address = (server_host, server_port)
+        if server_sock is not None:
+            server_sock.setblocking(False)
+            relay = _Relay(client_sock, server_sock, on_done, exchange, timing, deadline, address, replay)
+            relay.connected = True
+            relay.pooled = True
+            if timing is not None:
+                timing.connected = time.monotonic()
+            self._pick_loop().submit(relay)
+            return
+        
+        try:
+            server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server_sock.setblocking(False)
+            err = server_sock.connect_ex((server_host, server_port))
+        except OSError:
+            on_done(RETRYABLE)
+            return
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            server_sock.close()
+            on_done(RETRYABLE)
+            return
+
+        self._pick_loop().submit(_Relay(client_sock, server_sock, on_done, exchange, timing, deadline, address,
+                                        replay))
+
+    def _pick_loop(self):
+        with self._lock:
+            return next(self._next_loop)
+
+    def active_relays(self):
+        return sum(len(loop.relays) for loop in self.loops)
+
+    def get_stats(self):
+        # Counters are only written by their loop's thread; a slightly stale read is fine here
+        timeouts = dict.fromkeys(TIMEOUT_PHASES, 0)
+        for loop in self.loops:
+            for phase, count in loop.timeouts.items():
+                timeouts[phase] += count
+        return {
+            'active_relays': self.active_relays(),
+            'pending_timers': sum(loop.timers.count for loop in self.loops),
+            'stale_reconnects': sum(loop.stale_reconnects for loop in self.loops),
+            'timeouts': timeouts
+        }
+
+
+def _shutdown_write(sock):
+    try:
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
@@ -0,0 +1,74 @@
+import re
+from urllib.parse import unquote
+
+KEY_SOURCES = ('path', 'query', 'header', 'cookie', 'client_ip')
+
+
+class RequestKeyExtractor:
+    """
+    Derives the cache-affinity key of a request for key-aware strategies
+    such as BETA1Strategy.select_server_with_key.
+
+    Built once at startup from config['request_key'], e.g.
+    {'source': 'header', 'name': 'X-User-Id'} or {'source': 'path', 'segments': 2}.
+    The lookup is compiled into a single closure so the per-request cost is
+    one header scan or one regex search.
+    """
+
+    def __init__(self, source, name=None, segments=None):
+        if source not in KEY_SOURCES:
+            raise ValueError(f"request_key source must be one of {KEY_SOURCES}, got {source!r}")
+        if source in ('query', 'header', 'cookie') and not name:
+            raise ValueError(f"request_key source {source!r} needs a 'name'")
+
+        self.source = source
+        self.name = name
+        self.needs_http = source != 'client_ip'
+        self._extract = self._compile(source, name, segments)
+
+    @classmethod
+    def from_config(cls, spec):
+        if not spec:
+            return None
+        return cls(spec['source'], name=spec.get('name'), segments=spec.get('segments'))
+
+    def extract(self, request, addr):
+        """Return the key for a parsed request (or None if unavailable)"""
+        if self.needs_http and request is None:
+            return None
+        return self._extract(request, addr)
+
+    @staticmethod
+    def _compile(source, name, segments):
+        if source == 'client_ip':
+            return lambda request, addr: addr[0] if addr else None
+
+        if source == 'path':
+            def from_path(request, addr):
+                path = request.target.split('?', 1)[0]
+                if segments:
+                    path = '/'.join(path.split('/')[:segments + 1])
+                return path
+            return from_path
+
+        if source == 'query':
+            pattern = re.compile(r'(?:^|&)' + re.escape(name) + r'=([^&#]*)')
+
+            def from_query(request, addr):
+                _, _, query = request.target.partition('?')
+                match = pattern.search(query)
+                return unquote(match.group(1)) if match else None
+            return from_query
+
+        if source == 'header':
+            return lambda request, addr: request.header(name)
+
+        pattern = re.compile(r'(?:^|;)\s*' + re.escape(name) + r'=([^;]*)')
+
+        def from_cookie(request, addr):
+            cookies = request.header('Cookie')
+            if not cookies:
+                return None
+            match = pattern.search(cookies)
+            return match.group(1).strip() if match else None
+        return from_cookie
@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+
+from .http_parser import IDEMPOTENT_METHODS
+
+
+class RetryBudget:
+    """
+    Token bucket capping retries at a fraction of live traffic: every request
+    deposits `ratio` tokens and every retry spends one. A trickle of
+    `min_per_sec` tokens per second keeps retries possible at low traffic;
+    at most `burst` tokens can be saved up. During an outage, when most
+    requests fail, retries stop at the budget instead of multiplying load.
+    """
+
+    def __init__(self, ratio=0.2, min_per_sec=10, burst=None):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.burst = burst if burst is not None else max(min_per_sec, 1)
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def on_request(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def try_spend(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.refilled_at) * self.min_per_sec, self.burst)
+            self.refilled_at = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed attempt may go to another backend, and when
+
+    A retry must be safe: either nothing of the request reached the backend
+    (it was unreachable), or the backend failed before its first response
+    byte and the method is idempotent. L4 callers read the method from the
+    ReplayBuffer; streams that are not HTTP are resent only if
+    `retry_opaque` is set, since the backend may have acted on them. Safe
+    retries are still capped by `max_attempts` per request and by the
+    RetryBudget across requests. Callers exclude the backends a request has
+    already tried and wait backoff() between attempts.
+    """
+
+    def __init__(self, max_attempts=3, budget=None, backoff_ms=25, backoff_max_ms=250, retry_opaque=False):
+        self.max_attempts = max_attempts
+        self.budget = budget
+        self.backoff_base = backoff_ms / 1000.0
+        self.backoff_max = backoff_max_ms / 1000.0
+        self.retry_opaque = retry_opaque
+        self.lock = threading.Lock()
+
+        self.retries = 0
+        self.exhausted = 0  # Out of attempts
+        self.unsafe = 0  # Not retried because the backend may have acted on the request
+        self.budget_denied = 0
+
+    def on_request(self):
+        if self.budget:
+            self.budget.on_request()
+
+    def is_safe(self, sent, method=None):
+        """`sent`: request bytes reached the backend; `method`: None for an opaque stream"""
+        if not sent:
+            return True
+        if method is None:
+            return self.retry_opaque
+        return method in IDEMPOTENT_METHODS
+
+    def should_retry(self, attempt, sent, method=None):
+        """Called after attempt number `attempt` (0-based) failed; True spends a retry"""
+        if attempt + 1 >= self.max_attempts:
+            reason = 'exhausted'
+        elif not self.is_safe(sent, method):
+            reason = 'unsafe'
+        elif self.budget and not self.budget.try_spend():
+            reason = 'budget_denied'
+        else:
+            reason = 'retries'
+        with self.lock:
+            setattr(self, reason, getattr(self, reason) + 1)
+        return reason == 'retries'
+
+    def backoff(self, attempt, deadline=None):
+        """
+        Seconds to wait before the next attempt: full jitter over an
+        exponentially growing window, so retries from a burst of failures
+        spread out instead of arriving together. Never runs past `deadline`.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if deadline is not None:
+            delay = max(0.0, min(delay, deadline - time.monotonic()))
+        return delay
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'retries': self.retries,
+                'exhausted': self.exhausted,
+                'unsafe': self.unsafe,
+                'budget_denied': self.budget_denied
+            }
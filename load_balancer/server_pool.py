@@ -1,38 +1,172 @@
 import threading
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from functools import wraps
+
+from .timing import summarize
+
+_backend_ids = {}
+_backend_ids_lock = threading.Lock()
+
+
+def backend_id(host, port):
+    """
+    Small integer ID of host:port, the same for every pool in the process.
+    Strategies index per-backend state arrays with it.
+    """
+    key = f"{host}:{port}"
+    found = _backend_ids.get(key)
+    if found is not None:
+        return found
+    with _backend_ids_lock:
+        return _backend_ids.setdefault(key, len(_backend_ids))
+
+
+class Backend:
+    """
+    One backend server. Fields are plain attributes; `key` is "host:port"
+    and `id` comes from backend_id(). get_all_servers() returns plain dict
+    copies for callers outside the request path, such as the web interface.
+
+    Deprecated: dict-style access (srv['host'], srv['connections'] += 1)
+    still works for code written against the former dict records, at the
+    cost of a method call per access. New code should use the attributes.
+    """
+
+    __slots__ = ('id', 'host', 'port', 'key', 'healthy', 'connections', 'failures')
+    FIELDS = frozenset(__slots__)
+
+    def __init__(self, host, port):
+        self.id = backend_id(host, port)
+        self.host = host
+        self.port = port
+        self.key = f"{host}:{port}"
+        self.healthy = True
+        self.connections = 0
+        self.failures = 0
+
+    def __getitem__(self, name):
+        if name not in Backend.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in Backend.FIELDS:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in Backend.FIELDS
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in Backend.FIELDS else default
+
+    def keys(self):
+        return Backend.__slots__
+
+    def __repr__(self):
+        return (f"Backend({self.key}, id={self.id}, healthy={self.healthy}, "
+                f"connections={self.connections}, failures={self.failures})")
+
+
+def accepts_host_port(method):
+    """
+    Let a method that takes a Backend also accept the former (host, port)
+    arguments in its place. Deprecated: kept for callers written before the
+    Backend records; it costs a key format and a lookup per call.
+    """
+    @wraps(method)
+    def wrapper(self, srv, *args, **kwargs):
+        if not isinstance(srv, Backend):
+            srv = _legacy_backend(self, srv, args[0])
+            args = args[1:]
+        return method(self, srv, *args, **kwargs)
+    return wrapper
+
+
+def _legacy_backend(owner, host, port):
+    """The owner's record for host:port if it has one (a ServerPool), else a detached Backend"""
+    snapshot = getattr(owner, 'snapshot', None)
+    found = snapshot.by_key.get(f"{host}:{port}") if isinstance(snapshot, PoolSnapshot) else None
+    return found if found is not None else Backend(host, port)
+
+
+class PoolSnapshot:
+    """
+    Immutable view of pool membership and health. ServerPool replaces it
+    (never modifies it) whenever a server is added or changes health, so
+    request paths read ServerPool.snapshot without taking the lock. The
+    Backend records are the live ones, so their connection counts stay current.
+    """
+
+    __slots__ = ('version', 'servers', 'healthy', 'by_key')
+
+    def __init__(self, version=0, servers=()):
+        self.version = version
+        self.servers = tuple(servers)
+        self.healthy = tuple(srv for srv in self.servers if srv.healthy)
+        self.by_key = {srv.key: srv for srv in self.servers}
 
 
 class ServerPool:
-    def __init__(self):
+    def __init__(self, limit_factory=None):
         self.servers = {}
+        self.snapshot = PoolSnapshot()
+        # Optional per-backend adaptive concurrency limits (e.g. GradientLimit); None disables them
+        self.limit_factory = limit_factory
+        self.limits = {}
+        # Called (outside the lock) whenever a connection slot frees up, e.g. DispatchQueue.notify
+        self.capacity_listener = None
         self.lock = threading.Lock()
         self.manually_disabled = set()  # Track manually disabled servers
         self.response_times = defaultdict(list)  # Track response times for each server
+        self.timings = defaultdict(lambda: deque(maxlen=100))  # Recent RequestTiming breakdowns per server
     
     def add_server(self, host, port):
         with self.lock:
-            key = f"{host}:{port}"
-            self.servers[key] = {
-                'host': host,
-                'port': port,
-                'healthy': True,
-                'connections': 0,
-                'failures': 0
-            }
+            srv = Backend(host, port)
+            key = srv.key
+            self.servers[key] = srv
+            if self.limit_factory:
+                self.limits[key] = self.limit_factory()
+            self._publish()
+    
+    def _publish(self):
+        """Replace the snapshot after a membership or health change (caller holds the lock)"""
+        self.snapshot = PoolSnapshot(self.snapshot.version + 1, self.servers.values())
+    
+    def _set_healthy(self, srv, healthy):
+        if srv.healthy != healthy:
+            srv.healthy = healthy
+            self._publish()
     
     def get_healthy_servers(self):
-        with self.lock:
-            return [srv for srv in self.servers.values() if srv['healthy']]
+        """Tuple of healthy Backends from the current snapshot (don't modify it)"""
+        return self.snapshot.healthy
+    
+    def get_available_servers(self):
+        """Healthy servers that are below their concurrency limit"""
+        healthy = self.snapshot.healthy
+        if not self.limits:
+            return healthy
+        # Lock-free pre-filter; try_acquire() re-checks the limit and counts rejections under the lock
+        available = []
+        for srv in healthy:
+            limit = self.limits.get(srv.key)
+            if limit and srv.connections >= limit.current:
+                continue
+            available.append(srv)
+        return available
     
     def mark_unhealthy(self, host, port):
         with self.lock:
             key = f"{host}:{port}"
-            if key in self.servers:
-                self.servers[key]['failures'] += 1
+            srv = self.servers.get(key)
+            if srv:
+                srv.failures += 1
                 # Only mark unhealthy after multiple consecutive failures
-                if self.servers[key]['failures'] >= 3:
-                    self.servers[key]['healthy'] = False
+                if srv.failures >= 3:
+                    self._set_healthy(srv, False)
     
     def mark_healthy(self, host, port):
         with self.lock:
@@ -40,8 +174,8 @@ class ServerPool:
             if key in self.servers:
                 # Don't mark healthy if manually disabled
                 if key not in self.manually_disabled:
-                    self.servers[key]['healthy'] = True
-                    self.servers[key]['failures'] = 0
+                    self._set_healthy(self.servers[key], True)
+                    self.servers[key].failures = 0
     
     def manually_disable_server(self, host, port):
         """Manually disable a server (won't be re-enabled by health monitor)"""
@@ -49,7 +183,7 @@ class ServerPool:
             key = f"{host}:{port}"
             self.manually_disabled.add(key)
             if key in self.servers:
-                self.servers[key]['healthy'] = False
+                self._set_healthy(self.servers[key], False)
     
     def manually_enable_server(self, host, port):
         """Manually enable a server"""
@@ -57,56 +191,103 @@ class ServerPool:
             key = f"{host}:{port}"
             self.manually_disabled.discard(key)
             if key in self.servers:
-                self.servers[key]['healthy'] = True
-                self.servers[key]['failures'] = 0
+                self._set_healthy(self.servers[key], True)
+                self.servers[key].failures = 0
     
     def increment_connections(self, host, port):
         with self.lock:
             key = f"{host}:{port}"
             if key in self.servers:
-                self.servers[key]['connections'] += 1
+                self.servers[key].connections += 1
     
     def decrement_connections(self, host, port):
         with self.lock:
             key = f"{host}:{port}"
-            if key in self.servers and self.servers[key]['connections'] > 0:
-                self.servers[key]['connections'] -= 1
+            if key in self.servers and self.servers[key].connections > 0:
+                self.servers[key].connections -= 1
+        self._capacity_freed()
     
-    def get_server_info(self, host, port):
+    @accepts_host_port
+    def try_acquire(self, srv):
+        """Count a dispatch to the Backend unless it is at its concurrency limit"""
         with self.lock:
-            key = f"{host}:{port}"
-            return self.servers.get(key, None)
+            if self.servers.get(srv.key) is not srv:
+                return False
+            limit = self.limits.get(srv.key)
+            if limit and srv.connections >= limit.current:
+                limit.rejected += 1
+                return False
+            srv.connections += 1
+            return True
+    
+    @accepts_host_port
+    def release(self, srv, rtt=None, success=True):
+        """Undo try_acquire; a measured rtt (seconds) also adapts the server's limit"""
+        with self.lock:
+            if self.servers.get(srv.key) is not srv:
+                return
+            limit = self.limits.get(srv.key)
+            if limit and rtt is not None:
+                limit.on_sample(rtt, srv.connections, success)
+            if srv.connections > 0:
+                srv.connections -= 1
+        self._capacity_freed()
+    
+    def _capacity_freed(self):
+        if self.capacity_listener:
+            self.capacity_listener()
+    
+    def get_limit_stats(self):
+        with self.lock:
+            return {key: limit.get_stats() for key, limit in self.limits.items()}
+    
+    def get_server_info(self, host, port):
+        return self.snapshot.by_key.get(f"{host}:{port}")
     
     def get_all_servers(self):
         with self.lock:
             servers = []
             for srv in self.servers.values():
-                key = f"{srv['host']}:{srv['port']}"
+                key = srv.key
                 servers.append({
-                    'host': srv['host'],
-                    'port': srv['port'],
-                    'healthy': srv['healthy'],
-                    'connections': srv['connections'],
-                    'failures': srv['failures'],
+                    'host': srv.host,
+                    'port': srv.port,
+                    'healthy': srv.healthy,
+                    'connections': srv.connections,
+                    'failures': srv.failures,
                     'manually_disabled': key in self.manually_disabled
                 })
+                if key in self.limits:
+                    servers[-1]['limit'] = self.limits[key].current
             return servers
     
     def all_servers_down(self):
-        with self.lock:
-            if not self.servers:
-                return False
-            return not any(srv['healthy'] for srv in self.servers.values())
+        snapshot = self.snapshot
+        return bool(snapshot.servers) and not snapshot.healthy
     
-    def record_response_time(self, host, port, response_time):
-        """Record response time for a server"""
+    @accepts_host_port
+    def record_response_time(self, srv, response_time):
+        """Record response time for a Backend"""
         with self.lock:
-            key = f"{host}:{port}"
+            key = srv.key
             self.response_times[key].append(response_time)
             # Keep only recent 100 response times
             if len(self.response_times[key]) > 100:
                 self.response_times[key].pop(0)
     
+    @accepts_host_port
+    def record_timing(self, srv, timing):
+        """Keep the phase breakdown of a Backend's finished attempt (see RequestTiming)"""
+        breakdown = timing.breakdown()
+        with self.lock:
+            self.timings[srv.key].append(breakdown)
+    
+    def get_timing_stats(self):
+        """Per server average and p95 of connect, upload, TTFB, transfer and total time"""
+        with self.lock:
+            windows = {key: list(samples) for key, samples in self.timings.items()}
+        return {key: summarize(samples) for key, samples in windows.items()}
+    
     def get_average_response_time(self, host, port):
         """Get average response time for a server"""
         with self.lock:
@@ -4,6 +4,14 @@ import time
 import random
 from collections import defaultdict, deque
 
+from .server_pool import backend_id, accepts_host_port
+
+
+def _grow(array, index, factory):
+    """Extend a per-backend state array so `index` (a Backend.id) is valid"""
+    while len(array) <= index:
+        array.append(factory())
+
 
 class Strategy(ABC):
     """Base interface for load balancing strategies"""
@@ -41,8 +49,8 @@ class LeastConnectionsStrategy(Strategy):
         if not server_list:
             return None
         
-        min_conn = min(srv['connections'] for srv in server_list)
-        candidates = [srv for srv in server_list if srv['connections'] == min_conn]
+        min_conn = min(srv.connections for srv in server_list)
+        candidates = [srv for srv in server_list if srv.connections == min_conn]
 
         with self._lock:
             if not candidates:
@@ -77,8 +85,8 @@ class HealthScoreBasedStrategy(Strategy):
             best_score = -1
             
             for srv in server_list:
-                connection_factor = 1 / (1 + srv['connections'])
-                failure_factor = 1 / (1 + srv['failures'])
+                connection_factor = 1 / (1 + srv.connections)
+                failure_factor = 1 / (1 + srv.failures)
                 health_score = connection_factor * failure_factor
                 server_scores.append((srv, health_score))
                 
@@ -109,8 +117,8 @@ class HistoricalFailureWeightedRoundRobin(Strategy):
     """
     
     def __init__(self):
-        self.server_weights = {}
-        self.current_server = None
+        self.server_weights = []  # Indexed by Backend.id
+        self.current_server = None  # Backend.id
         self.current_weight_remaining = 0
         self.server_index = 0
         self.lock = threading.Lock()
@@ -130,33 +138,24 @@ class HistoricalFailureWeightedRoundRobin(Strategy):
         
         with self.lock:
             # Update weights for all servers
+            weights = self.server_weights
             for srv in server_list:
-                server_key = f"{srv['host']}:{srv['port']}"
-                self.server_weights[server_key] = self._calculate_weight(srv['failures'])
-            
-            # If no current server or current server not in list, start fresh
-            if (self.current_server is None or 
-                self.current_server not in [f"{s['host']}:{s['port']}" for s in server_list] or
-                self.current_weight_remaining <= 0):
-                
-                self.server_index = 0
-                if self.server_index < len(server_list):
-                    srv = server_list[self.server_index]
-                    self.current_server = f"{srv['host']}:{srv['port']}"
-                    self.current_weight_remaining = self.server_weights[self.current_server]
+                _grow(weights, srv.id, int)
+                weights[srv.id] = self._calculate_weight(srv.failures)
             
             # Find current server in list
             current_srv = None
             for srv in server_list:
-                if f"{srv['host']}:{srv['port']}" == self.current_server:
+                if srv.id == self.current_server:
                     current_srv = srv
                     break
             
-            if current_srv is None:
-                # Fallback to first server
+            # If no current server or current server not in list, start fresh
+            if current_srv is None or self.current_weight_remaining <= 0:
+                self.server_index = 0
                 current_srv = server_list[0]
-                self.current_server = f"{current_srv['host']}:{current_srv['port']}"
-                self.current_weight_remaining = self.server_weights[self.current_server]
+                self.current_server = current_srv.id
+                self.current_weight_remaining = weights[self.current_server]
             
             # Decrement weight
             self.current_weight_remaining -= 1
@@ -165,8 +164,8 @@ class HistoricalFailureWeightedRoundRobin(Strategy):
             if self.current_weight_remaining <= 0:
                 self.server_index = (self.server_index + 1) % len(server_list)
                 next_srv = server_list[self.server_index]
-                self.current_server = f"{next_srv['host']}:{next_srv['port']}"
-                self.current_weight_remaining = self.server_weights[self.current_server]
+                self.current_server = next_srv.id
+                self.current_weight_remaining = weights[self.current_server]
             
             return current_srv
 
@@ -180,27 +179,33 @@ class ResponseTimeBasedStrategy(Strategy):
     """
     
     def __init__(self, max_history=100):
-        self.response_times = defaultdict(list)  # server_key -> [response_times]
+        # Indexed by Backend.id: recent response times and their running sum
+        self.response_times = []
+        self.response_totals = []
         self.max_history = max_history
         self.lock = threading.Lock()
         self.round_robin_index = 0
     
-    def record_response_time(self, host, port, response_time):
-        """Record response time for a server"""
-        server_key = f"{host}:{port}"
+    @accepts_host_port
+    def record_response_time(self, srv, response_time):
+        """Record response time for a Backend"""
+        server_id = srv.id
         with self.lock:
-            self.response_times[server_key].append(response_time)
+            _grow(self.response_times, server_id, lambda: deque(maxlen=self.max_history))
+            _grow(self.response_totals, server_id, float)
+            times = self.response_times[server_id]
             # Keep only recent history
-            if len(self.response_times[server_key]) > self.max_history:
-                self.response_times[server_key].pop(0)
+            if len(times) == self.max_history:
+                self.response_totals[server_id] -= times[0]
+            times.append(response_time)
+            self.response_totals[server_id] += response_time
     
-    def _get_average_response_time(self, server_key):
+    def _get_average_response_time(self, server_id):
         """Get average response time for a server"""
-        if server_key not in self.response_times or not self.response_times[server_key]:
+        if server_id >= len(self.response_times) or not self.response_times[server_id]:
             return None  # No data available
         
-        times = self.response_times[server_key]
-        return sum(times) / len(times)
+        return self.response_totals[server_id] / len(self.response_times[server_id])
     
     def select_server(self, server_list):
         if not server_list:
@@ -212,8 +217,7 @@ class ResponseTimeBasedStrategy(Strategy):
             servers_without_data = []
             
             for srv in server_list:
-                server_key = f"{srv['host']}:{srv['port']}"
-                avg_time = self._get_average_response_time(server_key)
+                avg_time = self._get_average_response_time(srv.id)
                 
                 if avg_time is not None:
                     servers_with_data.append((srv, avg_time))
@@ -268,15 +272,8 @@ class ALPHA1Strategy(Strategy):
         # EWMA smoothing factor (0.3 = 30% new, 70% old)
         self.ewma_alpha = 0.3
         
-        # Per-server state tracking
-        self.server_state = defaultdict(lambda: {
-            'work_queue_ewma': 0.0,           # EWMA of estimated work in queue
-            'interference_signal': 0.0,        # Simulated interference metric
-            'head_request_age': 0.0,           # Age of oldest request in queue
-            'last_update': time.time(),
-            'request_timestamps': deque(maxlen=10),  # Track recent request times
-            'response_times': deque(maxlen=100),     # Track response times for p99
-        })
+        # Per-server state tracking, indexed by Backend.id
+        self.server_state = []
         
         # Global metrics for feedback control
         self.recent_latencies = deque(maxlen=1000)  # Track recent latencies for p99
@@ -287,6 +284,21 @@ class ALPHA1Strategy(Strategy):
         # Hedging statistics
         self.hedge_count = 0
         self.total_requests = 0
+    
+    @staticmethod
+    def _new_state():
+        return {
+            'work_queue_ewma': 0.0,           # EWMA of estimated work in queue
+            'interference_signal': 0.0,        # Simulated interference metric
+            'head_request_age': 0.0,           # Age of oldest request in queue
+            'last_update': time.time(),
+            'request_timestamps': deque(maxlen=10),  # Track recent request times
+            'response_times': deque(maxlen=100),     # Track response times for p99
+        }
+    
+    def _state(self, server_id):
+        _grow(self.server_state, server_id, self._new_state)
+        return self.server_state[server_id]
         
     def select_server(self, server_list):
         """
@@ -344,8 +356,7 @@ class ALPHA1Strategy(Strategy):
         Compute tail-risk score for a server
         Score = EWMA(work_remaining) + β*interference + γ*head_request_age
         """
-        server_key = f"{server['host']}:{server['port']}"
-        state = self.server_state[server_key]
+        state = self._state(server.id)
         
         # Component 1: Estimated work remaining (based on connections and recent activity)
         work_remaining = state['work_queue_ewma']
@@ -366,14 +377,13 @@ class ALPHA1Strategy(Strategy):
         Update server state with new request assignment
         Simulates queue dynamics and interference
         """
-        server_key = f"{server['host']}:{server['port']}"
-        state = self.server_state[server_key]
+        state = self._state(server.id)
         current_time = time.time()
         
         # Update work queue EWMA based on current connections
         # Use a normalized metric to avoid self-referential feedback
         # Normalize by total pool size to make it relative
-        current_work = server['connections']  # Use raw connections, not amplified
+        current_work = server.connections  # Use raw connections, not amplified
         state['work_queue_ewma'] = (
             self.ewma_alpha * current_work + 
             (1 - self.ewma_alpha) * state['work_queue_ewma']
@@ -397,9 +407,9 @@ class ALPHA1Strategy(Strategy):
         # Fix head request age: only track if there's actual queue buildup
         # Reset more aggressively to avoid accumulation
         time_since_last = current_time - state['last_update']
-        if server['connections'] > 2:  # Only accumulate if there's actual queueing
+        if server.connections > 2:  # Only accumulate if there's actual queueing
             # Age increases proportional to queue depth
-            state['head_request_age'] = min(state['head_request_age'] + (time_since_last * server['connections'] / 10.0), 1.0)
+            state['head_request_age'] = min(state['head_request_age'] + (time_since_last * server.connections / 10.0), 1.0)
         else:
             # Decay age when queue is small
             state['head_request_age'] = max(state['head_request_age'] * 0.5, 0.0)
@@ -430,17 +440,18 @@ class ALPHA1Strategy(Strategy):
             self.beta = max(self.beta * 0.98, 0.1)  # Decay by 2% (slower than before), floor at 0.1
             self.gamma = max(self.gamma * 0.98, 0.1)
     
-    def record_response_time(self, host, port, response_time_seconds):
+    @accepts_host_port
+    def record_response_time(self, srv, response_time_seconds):
         """
         Record response time for feedback control
         """
-        server_key = f"{host}:{port}"
+        server_id = srv.id
         response_time_ms = response_time_seconds * 1000
         
         with self.lock:
             # Track in server state
-            if server_key in self.server_state:
-                self.server_state[server_key]['response_times'].append(response_time_ms)
+            if server_id < len(self.server_state):
+                self.server_state[server_id]['response_times'].append(response_time_ms)
             
             # Track globally for p99 calculation
             self.recent_latencies.append(response_time_ms)
@@ -450,8 +461,7 @@ class ALPHA1Strategy(Strategy):
         Determine if request should be hedged based on SLO
         Returns True if predicted finish time exceeds SLO threshold
         """
-        server_key = f"{server['host']}:{server['port']}"
-        state = self.server_state[server_key]
+        state = self._state(server.id)
         
         # Predict finish time = current queue work + new request service time
         predicted_finish_ms = state['work_queue_ewma'] + estimated_service_time_ms
@@ -493,12 +503,12 @@ class ALPHA1Strategy(Strategy):
         """
         Get tail-risk metrics for a specific server
         """
-        server_key = f"{host}:{port}"
+        server_id = backend_id(host, port)
         with self.lock:
-            if server_key not in self.server_state:
+            if server_id >= len(self.server_state):
                 return {}
             
-            state = self.server_state[server_key]
+            state = self.server_state[server_id]
             
             # Calculate server p99 if we have data
             server_p99 = 0.0
@@ -604,7 +614,7 @@ class BETA1Strategy(Strategy):
             average_load = self._calculate_average_load(server_list)
             
             for server in ranked_servers:
-                server_key = f"{server['host']}:{server['port']}"
+                server_key = server.key
                 
                 if self._is_overloaded(server, average_load):
                     continue
@@ -627,7 +637,7 @@ class BETA1Strategy(Strategy):
                 self.bounded_load_redirects += 1
             
             # Update state
-            server_key = f"{chosen_server['host']}:{chosen_server['port']}"
+            server_key = chosen_server.key
             self._update_server_state(server_key, request_key)
             self.total_requests += 1
             
@@ -642,7 +652,7 @@ class BETA1Strategy(Strategy):
         
         server_weights = []
         for server in server_list:
-            server_id = f"{server['host']}:{server['port']}"
+            server_id = server.key
             # Compute hash weight: hash(key || server_id)
             combined = f"{key}:{server_id}".encode('utf-8')
             hash_value = int(hashlib.sha256(combined).hexdigest(), 16)
@@ -658,7 +668,7 @@ class BETA1Strategy(Strategy):
         Check if server is overloaded based on bounded-load constraint
         current_load ≤ capacity_factor × average_load
         """
-        current_load = server['connections']
+        current_load = server.connections
         threshold = self.capacity_factor * average_load
         return current_load > threshold
     
@@ -669,7 +679,7 @@ class BETA1Strategy(Strategy):
         if not server_list:
             return 0
         
-        total_load = sum(server['connections'] for server in server_list)
+        total_load = sum(server.connections for server in server_list)
         return total_load / len(server_list)
     
     def _in_warmup_mode(self, server_key):
@@ -738,7 +748,7 @@ class BETA1Strategy(Strategy):
         """
         Detect when servers are added or removed (scaling events)
         """
-        current_servers = {f"{s['host']}:{s['port']}" for s in server_list}
+        current_servers = {s.key for s in server_list}
         
         # Detect new servers
         new_servers = current_servers - self.known_servers
@@ -818,7 +828,8 @@ class BETA1Strategy(Strategy):
                 'warmup_requests': state['warmup_requests'],
             }
     
-    def record_response_time(self, host, port, response_time_seconds):
+    @accepts_host_port
+    def record_response_time(self, srv, response_time_seconds):
         """
         Record response time (for compatibility with other strategies)
         BETA1 doesn't use response time directly, but we track it for monitoring
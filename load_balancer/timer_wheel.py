@@ -0,0 +1,129 @@
+import math
+import time
+
+
+class Timer:
+    """Handle returned by TimerWheel.schedule(); pass it to cancel()"""
+
+    __slots__ = ('expires', 'callback', 'bucket')
+
+    def __init__(self, expires, callback):
+        self.expires = expires  # time.monotonic() at which the callback is due
+        self.callback = callback
+        self.bucket = None  # Set holding the timer while it is pending
+
+    @property
+    def pending(self):
+        return self.bucket is not None
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel for an event loop's timeouts
+
+    Level 0 has `slots` buckets of one `tick` each; every level above covers
+    `slots` times the span of the one below. A timer goes into the bucket of
+    the level that spans its expiry, so schedule() and cancel() are O(1)
+    whatever the number of timers. Buckets of higher levels are redistributed
+    to the level below as the wheel turns into them (cascading). Timers fire
+    up to one tick late, never early. Not thread-safe: use it from the loop
+    that calls advance().
+    """
+
+    def __init__(self, tick=0.01, slots=64, levels=4, now=None):
+        if slots & (slots - 1):
+            raise ValueError("slots must be a power of two")
+        self.tick = tick
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.horizon = 1 << (self.bits * levels)  # Ticks the top level can reach
+        self.wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.origin = time.monotonic() if now is None else now
+        self.current = 0  # Ticks since origin processed so far
+        self.count = 0
+
+    def schedule(self, delay, callback):
+        """Call callback() once `delay` seconds from now, unless cancelled"""
+        timer = Timer(time.monotonic() + delay, callback)
+        self._insert(timer)
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None and timer.bucket is not None:
+            timer.bucket.discard(timer)
+            timer.bucket = None
+            self.count -= 1
+
+    def advance(self, now=None):
+        """Fire every timer due by `now`; returns how many fired"""
+        now = time.monotonic() if now is None else now
+        target = int((now - self.origin) / self.tick)
+        if not self.count:
+            self.current = max(self.current, target)
+            return 0
+
+        fired = 0
+        while self.current < target:
+            self.current += 1
+            self._cascade()
+            bucket = self.wheels[0][self.current & self.mask]
+            if not bucket:
+                continue
+            due = list(bucket)
+            bucket.clear()
+            self.count -= len(due)
+            for timer in due:
+                timer.bucket = None
+                fired += 1
+                try:
+                    timer.callback()
+                except Exception as e:
+                    print(f"Timer callback error: {e}")
+            if not self.count:
+                self.current = target
+                break
+        return fired
+
+    def time_to_next(self, now=None):
+        """
+        Seconds until advance() next has work (a due level 0 bucket or a
+        cascade), or None when no timer is pending. Good as a select() timeout.
+        """
+        if not self.count:
+            return None
+        now = time.monotonic() if now is None else now
+        slots = self.mask + 1
+        ticks = slots - (self.current & self.mask)  # Next cascade point
+        for ahead in range(1, ticks):
+            if self.wheels[0][(self.current + ahead) & self.mask]:
+                ticks = ahead
+                break
+        return max(self.origin + (self.current + ticks) * self.tick - now, 0.0)
+
+    def _insert(self, timer):
+        expiry = max(math.ceil((timer.expires - self.origin) / self.tick), self.current + 1)
+        # Beyond the top level's reach: park at its edge; cascading re-files it later
+        expiry = min(expiry, self.current + self.horizon - 1)
+        delta = expiry - self.current
+        level = 0
+        while level < len(self.wheels) - 1 and delta >= 1 << (self.bits * (level + 1)):
+            level += 1
+        bucket = self.wheels[level][(expiry >> (self.bits * level)) & self.mask]
+        bucket.add(timer)
+        timer.bucket = bucket
+        self.count += 1
+
+    def _cascade(self):
+        """Redistribute the higher-level buckets the wheel has just turned into"""
+        for level in range(1, len(self.wheels)):
+            shift = self.bits * level
+            if self.current & ((1 << shift) - 1):
+                return  # Lower levels haven't wrapped, so neither has this one
+            bucket = self.wheels[level][(self.current >> shift) & self.mask]
+            if not bucket:
+                continue
+            moved = list(bucket)
+            bucket.clear()
+            self.count -= len(moved)
+            for timer in moved:
+                self._insert(timer)
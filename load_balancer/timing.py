@@ -0,0 +1,65 @@
+import time
+
+# Phases of RequestTiming.breakdown(), in order
+PHASES = ('buffering', 'connect', 'upload', 'ttfb', 'transfer', 'total')
+
+
+class RequestTiming:
+    """
+    Timestamps (time.monotonic()) of one attempt against a backend, filled
+    in by the data plane as the attempt progresses. Phases it never reached
+    stay None. Created when the request is dispatched; `buffering` is the
+    time spent reading the request body before that, if it was buffered.
+    """
+
+    __slots__ = ('buffering', 'dispatched', 'connected', 'request_sent', 'first_byte', 'last_byte')
+
+    def __init__(self, buffering=None):
+        self.buffering = buffering
+        self.dispatched = time.monotonic()
+        self.connected = None
+        self.request_sent = None  # Last request bytes written before the response began
+        self.first_byte = None
+        self.last_byte = None
+
+    def mark_sent(self):
+        if self.first_byte is None:
+            self.request_sent = time.monotonic()
+
+    def mark_first_byte(self):
+        if self.first_byte is None:
+            self.first_byte = time.monotonic()
+
+    @property
+    def ttfb(self):
+        """Backend service time: request sent to first response byte"""
+        if self.first_byte is None:
+            return None
+        sent = self.request_sent or self.connected or self.dispatched
+        return max(self.first_byte - sent, 0.0)
+
+    def breakdown(self):
+        """Seconds spent in each phase (None for phases not reached); 'total' starts at dispatch"""
+        connected = self.connected or self.dispatched
+        sent = self.request_sent or connected
+        return {
+            'buffering': self.buffering,
+            'connect': connected - self.dispatched,
+            'upload': sent - connected,
+            'ttfb': self.ttfb,
+            'transfer': self.last_byte - self.first_byte if self.last_byte and self.first_byte else None,
+            'total': self.last_byte - self.dispatched if self.last_byte else None
+        }
+
+
+def summarize(samples):
+    """Average and p95 in ms of every phase over a window of breakdown() dicts"""
+    summary = {'samples': len(samples)}
+    for phase in PHASES:
+        values = sorted(s[phase] for s in samples if s[phase] is not None)
+        if values:
+            summary[f'{phase}_avg_ms'] = round(sum(values) / len(values) * 1000, 2)
+            summary[f'{phase}_p95_ms'] = round(values[min(int(len(values) * 0.95), len(values) - 1)] * 1000, 2)
+        else:
+            summary[f'{phase}_avg_ms'] = summary[f'{phase}_p95_ms'] = None
+    return summary
@@ -0,0 +1,272 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+# Stats sections merged across workers, with the counter their averages are weighted by
+_MERGED_SECTIONS = (
+    ('priority_classes', 'requests'),
+    ('hedging', None),
+    ('relay_engine', None),
+    ('response_buffering', None),
+    ('request_buffering', 'buffered'),
+)
+# Windows and gauges describing a worker's current state: merged over live workers only.
+# Every worker has its own limiter per backend, so concurrency limits add up.
+_LIVE_SECTIONS = (
+    ('backend_timings', 'samples'),
+    ('concurrency_limits', None),
+)
+# Configuration echoed in stats; the same in every worker
+_SETTINGS = frozenset(('rank', 'weight', 'shed_at', 'memory_limit', 'max_size'))
+
+
+def _merge(reports, weight=None):
+    """
+    Combine one stats dict per worker. Counters are summed, `_ms` averages
+    are weighted by the `weight` counter of each report (a plain mean
+    without one), p95s take the worst worker and settings pass through.
+    Nested dicts (per class, per server, per phase) are merged the same way.
+    """
+    merged = {}
+    for key in dict.fromkeys(k for report in reports for k in report):
+        present = [report for report in reports if report.get(key) is not None]
+        if not present:
+            merged[key] = None
+            continue
+        values = [report[key] for report in present]
+        if isinstance(values[0], dict):
+            merged[key] = _merge(values, weight)
+        elif key in _SETTINGS:
+            merged[key] = values[0]
+        elif 'p95' in key:
+            merged[key] = max(values)
+        elif key.endswith('_ms'):
+            weights = [report.get(weight, 0) if weight else 1 for report in present]
+            if not sum(weights):
+                weights = [1] * len(values)
+            merged[key] = round(sum(v * w for v, w in zip(values, weights)) / sum(weights), 2)
+        else:
+            merged[key] = sum(values)
+    return merged
+
+
+def _worker_main(index, config, servers, stats_queue, cpu):
+    """Entry point of one worker process: its own listener, accept loop and strategy"""
+    from .load_balancer import LoadBalancer
+
+    # The supervisor owns the lifecycle; Ctrl+C is handled there
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as e:
+            print(f"Worker {index}: could not pin to CPU {cpu}: {e}")
+
+    worker_config = dict(config)
+    worker_config['workers'] = 1
+    worker_config['reuse_port'] = True
+
+    lb = LoadBalancer(worker_config)
+    for host, port in servers:
+        lb.add_backend_server(host, port)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: lb.stop())
+
+    def report_stats():
+        while True:
+            time.sleep(1.0)
+            try:
+                stats_queue.put((index, os.getpid(), lb.get_performance_stats()))
+            except Exception:
+                return
+
+    threading.Thread(target=report_stats, daemon=True).start()
+    lb.start()
+
+
+class WorkerSupervisor:
+    """
+    Pre-fork SO_REUSEPORT worker mode
+
+    Starts N worker processes that each bind listen_port with SO_REUSEPORT, so
+    the kernel spreads incoming connections across them and the balancer is
+    no longer limited to one core by the GIL. Dead workers are restarted and
+    the stats each worker reports are aggregated for get_performance_stats.
+    """
+
+    def __init__(self, config, servers, num_workers, pin_cpus=False):
+        self.config = config
+        self.servers = list(servers)
+        self.num_workers = num_workers
+        self.pin_cpus = pin_cpus
+
+        # spawn avoids inheriting locks held by the parent's threads at fork time
+        self.ctx = multiprocessing.get_context('spawn')
+        self.stats_queue = self.ctx.Queue()
+        self.processes = {}
+        self.restarts = {}
+        self.worker_stats = {}
+        self.retired_stats = []  # Last reports of workers that died, so totals never go backwards
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        for index in range(self.num_workers):
+            self.restarts[index] = 0
+            self._spawn(index)
+        print(f"Started {self.num_workers} worker processes on port {self.config['listen_port']}")
+
+    def _spawn(self, index):
+        cpu = None
+        if self.pin_cpus:
+            cpu = index % (os.cpu_count() or 1)
+        proc = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self.config, self.servers, self.stats_queue, cpu),
+            name=f"lb-worker-{index}",
+            daemon=True
+        )
+        proc.start()
+        self.processes[index] = proc
+
+    def supervise(self):
+        """Restart dead workers and collect their stats until stop() is called"""
+        while self.running:
+            self._drain_stats(timeout=1.0)
+            for index, proc in list(self.processes.items()):
+                if self.running and not proc.is_alive():
+                    print(f"Worker {index} (pid {proc.pid}) exited with code {proc.exitcode}, restarting")
+                    self.restarts[index] += 1
+                    self._retire(index)
+                    self._spawn(index)
+
+    def _drain_stats(self, timeout):
+        try:
+            item = self.stats_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            index, pid, stats = item
+            with self.lock:
+                self.worker_stats[index] = (pid, stats)
+            try:
+                item = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _retire(self, index):
+        with self.lock:
+            report = self.worker_stats.pop(index, None)
+            if report:
+                pid, stats = report
+                stats = dict(stats)
+                stats['active_connections'] = 0
+                stats['peak_connections'] = 0
+                if 'relay_engine' in stats:
+                    stats['relay_engine'] = dict(stats['relay_engine'], active_relays=0, pending_timers=0)
+                self.retired_stats.append(stats)
+
+    def stop(self):
+        self.running = False
+        for proc in self.processes.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in self.processes.values():
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.kill()
+
+    def get_aggregated_stats(self, uptime):
+        """Combine the latest report from every worker into one stats dict"""
+        with self.lock:
+            reports = dict(self.worker_stats)
+            retired = list(self.retired_stats)
+
+        totals = {
+            'total_requests': 0,
+            'successful_requests': 0,
+            'failed_requests': 0,
+            'deadline_expired': 0,
+            'active_connections': 0,
+            'peak_connections': 0,
+        }
+        server_counts = {}
+        pool_totals = {}
+        admission_totals = {}
+        queue_totals = {}
+        retry_totals = {}
+        recent = []
+        weighted_response_time = 0.0
+        workers = []
+
+        live = []
+        for index in sorted(self.processes):
+            proc = self.processes[index]
+            pid, stats = reports.get(index, (proc.pid, {}))
+            live.append(stats)
+            workers.append({
+                'index': index,
+                'pid': pid,
+                'alive': proc.is_alive(),
+                'restarts': self.restarts.get(index, 0),
+                'total_requests': stats.get('total_requests', 0)
+            })
+
+        for stats in live + retired:
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+            for server, count in stats.get('server_request_counts', {}).items():
+                server_counts[server] = server_counts.get(server, 0) + count
+            recent.extend(stats.get('recent_requests', []))
+            for key, value in stats.get('connection_pool', {}).items():
+                if key != 'hit_rate':
+                    pool_totals[key] = pool_totals.get(key, 0) + value
+            for key, value in stats.get('admission', {}).items():
+                if key != 'queue_wait_ms':
+                    admission_totals[key] = admission_totals.get(key, 0) + value
+            for key, value in stats.get('dispatch_queue', {}).items():
+                if key != 'avg_wait_ms':
+                    queue_totals[key] = queue_totals.get(key, 0) + value
+            for key, value in stats.get('retries', {}).items():
+                retry_totals[key] = retry_totals.get(key, 0) + value
+            weighted_response_time += stats.get('avg_response_time_ms', 0) * stats.get('successful_requests', 0)
+
+        finished = totals['successful_requests'] + totals['failed_requests']
+        recent.sort(key=lambda r: r['timestamp'])
+
+        result = dict(totals)
+        result.update({
+            'uptime_seconds': round(uptime, 1),
+            'success_rate': round((totals['successful_requests'] / max(finished, 1)) * 100, 1),
+            'avg_response_time_ms': round(weighted_response_time / max(totals['successful_requests'], 1), 2),
+            'throughput_per_minute': round((totals['total_requests'] / max(uptime/60, 1)), 1),
+            'total_bytes_transferred': totals['total_requests'] * 1024,  # Estimate
+            'error_count': totals['failed_requests'],
+            'server_request_counts': server_counts,
+            'recent_requests': recent[-10:],
+            'workers': workers
+        })
+        if admission_totals:
+            result['admission'] = admission_totals  # Each worker enforces max_connections on its own
+        if queue_totals:
+            result['dispatch_queue'] = queue_totals
+        if retry_totals:
+            result['retries'] = retry_totals
+        if pool_totals:
+            lookups = pool_totals.get('hits', 0) + pool_totals.get('misses', 0)
+            pool_totals['hit_rate'] = round((pool_totals.get('hits', 0) / max(lookups, 1)) * 100, 1)
+            result['connection_pool'] = pool_totals
+        for section, weight in _MERGED_SECTIONS:
+            reports = [stats[section] for stats in live + retired if stats.get(section)]
+            if reports:
+                result[section] = _merge(reports, weight)
+        for section, weight in _LIVE_SECTIONS:
+            reports = [stats[section] for stats in live if stats.get(section)]
+            if reports:
+                result[section] = _merge(reports, weight)
+        return result
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import random
+
+# Add parent directory to path to import load_balancer modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_balancer.server_pool import ServerPool
+from load_balancer.strategies import (RoundRobinStrategy, LeastConnectionsStrategy, HealthScoreBasedStrategy,
+                                      HistoricalFailureWeightedRoundRobin, ResponseTimeBasedStrategy,
+                                      ALPHA1Strategy, BETA1Strategy)
+
+
+class SelectionBenchmark:
+    """
+    Measures the CPU cost of one server selection per strategy.
+
+    Each iteration does what the request path does around a strategy: read
+    the available servers from the pool, select one, take and release a
+    connection slot on it, and report a response time back to strategies
+    that track them.
+    With legacy=True the same loop goes through the former dict-style
+    access and (host, port) calls, which the compatibility shim still
+    accepts, so the two conventions can be compared side by side.
+    Only the calling thread's CPU time is counted.
+    """
+
+    def __init__(self, selections=100000, seed=1):
+        self.selections = selections
+        self.seed = seed
+
+    def _pool(self, num_servers):
+        pool = ServerPool()
+        for i in range(num_servers):
+            pool.add_server(f"10.0.{i // 256}.{i % 256}", 8000 + i)
+        return pool
+
+    def run(self, name, strategy, num_servers, legacy=False):
+        pool = self._pool(num_servers)
+        records_times = isinstance(strategy, (ResponseTimeBasedStrategy, ALPHA1Strategy))
+        rng = random.Random(self.seed)
+        latencies = [rng.uniform(0.005, 0.05) for _ in range(1024)]
+
+        start_cpu = time.thread_time()
+        if legacy:
+            for i in range(self.selections):
+                srv = strategy.select_server(pool.get_available_servers())
+                host, port = srv['host'], srv['port']
+                pool.try_acquire(host, port)
+                pool.release(host, port)
+                if records_times:
+                    strategy.record_response_time(host, port, latencies[i & 1023])
+        else:
+            for i in range(self.selections):
+                srv = strategy.select_server(pool.get_available_servers())
+                pool.try_acquire(srv)
+                pool.release(srv)
+                if records_times:
+                    strategy.record_response_time(srv, latencies[i & 1023])
+        cpu = time.thread_time() - start_cpu
+
+        return {
+            'name': name,
+            'servers': num_servers,
+            'legacy': legacy,
+            'ns_per_selection': cpu / self.selections * 1e9,
+            'selections_per_cpu_sec': self.selections / max(cpu, 1e-9)
+        }
+
+
+if __name__ == "__main__":
+    selections = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bench = SelectionBenchmark(selections=selections)
+
+    strategies = [
+        ("round_robin", RoundRobinStrategy),
+        ("least_connections", LeastConnectionsStrategy),
+        ("health_score", HealthScoreBasedStrategy),
+        ("weighted_round_robin", HistoricalFailureWeightedRoundRobin),
+        ("response_time", ResponseTimeBasedStrategy),
+        ("alpha1", ALPHA1Strategy),
+        ("beta1", BETA1Strategy),
+    ]
+
+    results = []
+    for num_servers in (4, 16, 64):
+        for name, cls in strategies:
+            results.append((bench.run(name, cls(), num_servers),
+                            bench.run(name, cls(), num_servers, legacy=True)))
+
+    print(f"\n=== SERVER SELECTION COST ({selections} selections) ===")
+    print(f"{'Strategy':<22} {'Servers':<9} {'ns/selection':<14} {'Selections/CPU s':<18}"
+          f"{'Legacy ns':<12} {'Saved':<8}")
+    print("-" * 86)
+    for r, old in results:
+        saved = 1 - r['ns_per_selection'] / old['ns_per_selection']
+        print(f"{r['name']:<22} {r['servers']:<9} {r['ns_per_selection']:<14.0f} "
+              f"{r['selections_per_cpu_sec']:<18.0f}{old['ns_per_selection']:<12.0f} {saved:<8.0%}")
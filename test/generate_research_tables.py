@@ -123,18 +123,18 @@ class DataCollectorSimulation:
                 
                 if not selected: continue
                 
-                s_key = f"{selected['host']}:{selected['port']}"
+                s_key = f"{selected.host}:{selected.port}"
                 srv = server_map.get(s_key)
                 
-                pool.increment_connections(selected['host'], selected['port'])
+                pool.increment_connections(selected.host, selected.port)
                 success, lat, is_hit, reason = srv.process_request(key, size)
-                pool.decrement_connections(selected['host'], selected['port'])
+                pool.decrement_connections(selected.host, selected.port)
                 
                 if hasattr(strategy, 'record_response_time'):
-                     strategy.record_response_time(selected['host'], selected['port'], lat / 1000.0)
+                     strategy.record_response_time(selected, lat / 1000.0)
                 if success:
-                     pool.mark_healthy(selected['host'], selected['port'])
-                     pool.record_response_time(selected['host'], selected['port'], lat / 1000.0)
+                     pool.mark_healthy(selected.host, selected.port)
+                     pool.record_response_time(selected, lat / 1000.0)
 
                 with lock:
                     outcome = 'Hit' if is_hit else ('Miss' if success else reason)
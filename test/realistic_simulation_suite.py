@@ -167,12 +167,12 @@ class RealisticSimulationSuite:
                     if not selected: continue
                     
                     # Process
-                    s_key = f"{selected['host']}:{selected['port']}"
+                    s_key = f"{selected.host}:{selected.port}"
                     srv = server_map.get(s_key)
                     
-                    pool.increment_connections(selected['host'], selected['port'])
+                    pool.increment_connections(selected.host, selected.port)
                     success, lat, is_hit, reason = srv.process_request(key, size)
-                    pool.decrement_connections(selected['host'], selected['port'])
+                    pool.decrement_connections(selected.host, selected.port)
                     
                     # Record
                     with lock:
@@ -187,10 +187,10 @@ class RealisticSimulationSuite:
                     
                     # Feedback
                     if hasattr(strategy, 'record_response_time'):
-                         strategy.record_response_time(selected['host'], selected['port'], lat / 1000.0)
+                         strategy.record_response_time(selected, lat / 1000.0)
                     if success:
-                         pool.mark_healthy(selected['host'], selected['port'])
-                         pool.record_response_time(selected['host'], selected['port'], lat / 1000.0)
+                         pool.mark_healthy(selected.host, selected.port)
+                         pool.record_response_time(selected, lat / 1000.0)
 
                     reqs_done += 1
             
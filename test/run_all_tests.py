@@ -89,8 +89,8 @@ class ComprehensiveEvaluator:
         
         # Reset pool connections
         for srv_info in self.pool.servers.values():
-            srv_info['connections'] = 0
-            srv_info['failures'] = 0
+            srv_info.connections = 0
+            srv_info.failures = 0
         
         strategy = strategy_class()
         
@@ -131,18 +131,18 @@ class ComprehensiveEvaluator:
                         results['errors'] += 1
                     continue
                     
-                s_key = f"{selected['host']}:{selected['port']}"
+                s_key = f"{selected.host}:{selected.port}"
                 mock_server = self.server_map.get(s_key)
                 
                 # 3. Process request on mock server
-                self.pool.increment_connections(selected['host'], selected['port'])
+                self.pool.increment_connections(selected.host, selected.port)
                 
                 # Actually simulate with sleep for realistic timing
                 success, latency, is_hit, error_reason = mock_server.process_request(
                     key, size, timeout_ms=self.timeout_ms, simulate_sleep=True
                 )
                 
-                self.pool.decrement_connections(selected['host'], selected['port'])
+                self.pool.decrement_connections(selected.host, selected.port)
                 
                 # 4. Record results
                 with lock:
@@ -161,20 +161,16 @@ class ComprehensiveEvaluator:
                 
                 # 5. Feedback to strategy (if supported)
                 if hasattr(strategy, 'record_response_time'):
-                    strategy.record_response_time(
-                        selected['host'], selected['port'], latency / 1000.0
-                    )
+                    strategy.record_response_time(selected, latency / 1000.0)
                 
                 # 6. Update pool health
                 if success:
-                    self.pool.mark_healthy(selected['host'], selected['port'])
-                    self.pool.record_response_time(
-                        selected['host'], selected['port'], latency / 1000.0
-                    )
+                    self.pool.mark_healthy(selected.host, selected.port)
+                    self.pool.record_response_time(selected, latency / 1000.0)
                 else:
                     # Mark unhealthy on timeout or failure
                     if error_reason in ['timeout', 'server_failure', 'server_down']:
-                        self.pool.mark_unhealthy(selected['host'], selected['port'])
+                        self.pool.mark_unhealthy(selected.host, selected.port)
                     # For overload, don't mark unhealthy, just retry
 
         # Run concurrent clients
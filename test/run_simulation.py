@@ -63,8 +63,8 @@ class SimulationRunner:
             with self.pool.lock:
                 key = f"{s.host}:{s.port}"
                 if key in self.pool.servers:
-                    self.pool.servers[key]['connections'] = 0
-                    self.pool.servers[key]['failures'] = 0
+                    self.pool.servers[key].connections = 0
+                    self.pool.servers[key].failures = 0
         
         strategy = strategy_class()
         
@@ -98,18 +98,18 @@ class SimulationRunner:
                     with lock: results['errors'] += 1
                     continue
                     
-                s_key = f"{selected['host']}:{selected['port']}"
+                s_key = f"{selected.host}:{selected.port}"
                 mock_server = self.server_map.get(s_key)
                 
                 # Simulate Network Delay (RTT)
                 time.sleep(random.uniform(self.min_network_delay, self.max_network_delay))
                 
                 # 2. Simulate Processing
-                self.pool.increment_connections(selected['host'], selected['port'])
+                self.pool.increment_connections(selected.host, selected.port)
                 
                 success, latency, is_hit, _ = mock_server.process_request(key, size)
                 
-                self.pool.decrement_connections(selected['host'], selected['port'])
+                self.pool.decrement_connections(selected.host, selected.port)
                 
                 # 3. Record Stats
                 with lock:
@@ -122,12 +122,12 @@ class SimulationRunner:
                 # 4. Feedback to Strategy (if supported)
                 if hasattr(strategy, 'record_response_time'):
                     # Convert ms to seconds for the strategy API
-                    strategy.record_response_time(selected['host'], selected['port'], latency / 1000.0)
+                    strategy.record_response_time(selected, latency / 1000.0)
                 
                 # Update Pool
                 if success:
-                    self.pool.mark_healthy(selected['host'], selected['port'])
-                    self.pool.record_response_time(selected['host'], selected['port'], latency / 1000.0)
+                    self.pool.mark_healthy(selected.host, selected.port)
+                    self.pool.record_response_time(selected, latency / 1000.0)
                 else:
                     # Don't mark unhealthy immediately in simulation to keep load high
                     pass
@@ -32,6 +32,8 @@ class WebAppHandler(BaseHTTPRequestHandler):
             self.serve_recent_requests()
         elif path == '/api/algorithm-metrics':
             self.serve_algorithm_metrics()
+        elif path == '/api/priority-classes':
+            self.serve_priority_classes()
         elif path.startswith('/static/'):
             self.serve_static(path)
         else:
@@ -122,6 +124,20 @@ class WebAppHandler(BaseHTTPRequestHandler):
             }
         self.send_json_response(data)
     
+    def serve_priority_classes(self):
+        # Per-class latency and shed counts (empty when priority_classes is not configured)
+        if self.lb:
+            stats = self.lb.get_performance_stats()
+            data = {
+                'classes': stats.get('priority_classes', {}),
+                'admission': stats.get('admission', {}),
+                'dispatch_queue': stats.get('dispatch_queue', {}),
+                'timestamp': time.time()
+            }
+        else:
+            data = {'classes': {}, 'admission': {}, 'dispatch_queue': {}, 'timestamp': time.time()}
+        self.send_json_response(data)
+    
     def serve_algorithm_metrics(self):
         """Serve algorithm-specific metrics"""
         if not self.lb:
@@ -130,6 +146,7 @@ class WebAppHandler(BaseHTTPRequestHandler):
         
         strategy_name = self.lb.config.get('strategy', 'round_robin')
         servers = self.lb.pool.get_all_servers()
+        timings = self.lb.pool.get_timing_stats()
         
         metrics = {
             'strategy': strategy_name,
@@ -143,7 +160,9 @@ class WebAppHandler(BaseHTTPRequestHandler):
                 'port': srv['port'],
                 'healthy': srv['healthy'],
                 'connections': srv['connections'],
-                'failures': srv['failures']
+                'failures': srv['failures'],
+                # Connect / upload / TTFB / transfer breakdown of recent requests
+                'timing': timings.get(f"{srv['host']}:{srv['port']}")
             }
             
             # Add health score for HS-BS
@@ -209,7 +228,7 @@ class WebAppHandler(BaseHTTPRequestHandler):
         if self.lb and host and port:
             srv_info = self.lb.pool.get_server_info(host, port)
             if srv_info:
-                if srv_info['healthy']:
+                if srv_info.healthy:
                     self.lb.pool.manually_disable_server(host, port)
                     result = {'success': True, 'action': 'stopped', 'server': f'{host}:{port}'}
                 else: